@@ -1,35 +1,83 @@
 #!/usr/bin/env python3
-from flask import Flask, jsonify, request, render_template, session, redirect, url_for
-from functools import wraps
+from flask import Flask, Response, g, jsonify, request, render_template, session, redirect, url_for, stream_with_context
 import json
 import subprocess
 import shutil
 import os
 import time
-import hashlib
-import struct
+import collections
 import sys
+import signal
+import threading
 from threading import Lock
 
 # Add current directory to path to import drivers
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+import auth
+import config_store
+import config_watch
+import event_stream
+import jitter_buffer
+import jobs
+import level_bus
+import link_prober
+import meter_service
+import metrics
+import pcm_sink
+import playback_controller
+import playback_engine
+import stream_relay
+import tone_engine
+from supervisor import SUPERVISOR
+
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'decoder-web-secret-key-change-in-production'
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+auth.configure(app)
+login_required = auth.login_required
+
+
+@app.before_request
+def _request_started():
+    g.request_t0 = time.monotonic()
+
 
-# Default credentials
-ADMIN_USERNAME = 'admin'
-ADMIN_PASSWORD_HASH = hashlib.sha256('admin123'.encode()).hexdigest()
+@app.after_request
+def _request_finished(response):
+    t0 = g.get('request_t0')
+    if t0 is not None:
+        # for /api/events this is the time to open the stream, not its lifetime
+        REQUEST_SECONDS.observe(time.monotonic() - t0, endpoint=request.endpoint or 'unknown',
+                                method=request.method, status=response.status_code)
+    return response
+
+REQUEST_SECONDS = metrics.REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, per endpoint.', ('endpoint', 'method', 'status'))
+FAILOVERS = metrics.REGISTRY.counter(
+    'failovers_total', 'Automatic link failovers run by the monitor, by outcome.', ('result',))
+FAILOVER_SECONDS = metrics.REGISTRY.histogram(
+    'failover_duration_seconds', 'Failover start until audio from the other link (or giving up).',
+    buckets=metrics.STARTUP_BUCKETS)
 
-PLAYER_PROC = None
-TEST_PROC = None
 CURRENT_VOLUME = 100
+TEST_THREAD = None              # streams a synthesized tone into the test sink
+TEST_STOP = threading.Event()
+TEST_LOCK = threading.RLock()   # serializes test tone start/stop
+
+
+def _relayed(url: str) -> str:
+    """Address local decoders and meters open for `url`: the loopback relay for configured links."""
+    return RELAY.local_url(url)
 
-PLAYBACK_ENABLED = True
 
-BG_PROCS = {1: None, 2: None}
+METERS = meter_service.MeterService(resolve=_relayed)
+OUTPUT_LEVELS = level_bus.LevelReader()
+EVENTS = event_stream.EventHub()
+# the watchdog on the decoded PCM of the link on air can trigger failover directly
+ENGINE = playback_engine.PlaybackEngine(resolve=_relayed,
+                                        on_fault=lambda idx, reason: _on_engine_fault(idx, reason))
+# one worker executes player commands in order; handlers return a job id right away
+JOBS = jobs.JobQueue(on_update=lambda job: EVENTS.publish('job', job.as_dict(), key=f'job:{job.id}'),
+                     on_evict=lambda job: EVENTS.forget(f'job:{job.id}'))
 
 DEFAULT_CONFIG = {
     'stream_url': '',
@@ -41,6 +89,7 @@ DEFAULT_CONFIG = {
     'test_frequency': 440,
     'test_duration': 5,
     'test_device': 'hw:0,0',
+    'latency_profile': jitter_buffer.DEFAULT_PROFILE,
     'is_playing': False
 }
 
@@ -63,14 +112,50 @@ def load_config():
 
 
 CONFIG = load_config()
+# playback state (idle/starting/playing/failing-over/stopping); readers use CONTROLLER.snapshot.
+# Enabled only if playback was left on: a box stopped by the user stays stopped across restarts.
+CONTROLLER = playback_controller.PlaybackController(enabled=bool(CONFIG.get('is_playing')))
+ENGINE.set_profile(CONFIG.get('latency_profile'))
+# what persist_config wrote recently, to tell our own writes (whose events
+# may arrive after a newer write) from outside edits
+_PERSISTED = collections.deque(maxlen=4)
+
+
+def _config_snapshot() -> dict:
+    with CONFIG_LOCK:
+        data = dict(CONFIG)
+        _PERSISTED.append(data)
+    return data
+
+
+# Bursts of update_config() (several per request) become one atomic write; flushed at exit
+CONFIG_STORE = config_store.ConfigStore(
+    CONFIG_PATH, _config_snapshot,
+    on_error=lambda err: app.logger.warning('Failed to write config: %s', err))
 
 
 def persist_config():
-    try:
-        with open(CONFIG_PATH, 'w', encoding='utf-8') as handle:
-            json.dump(CONFIG, handle, indent=2)
-    except Exception as err:
-        app.logger.warning('Failed to write config: %s', err)
+    CONFIG_STORE.mark_dirty()
+
+
+def _config_file_changed(data: dict):
+    """Adopt edits made to config.json by hand or by other tools."""
+    with CONFIG_LOCK:
+        if data in _PERSISTED:
+            return
+        links_before = (CONFIG.get('stream_url1'), CONFIG.get('stream_url2'))
+        for key in CONFIG:
+            if key in data:
+                CONFIG[key] = data[key]
+        links_changed = links_before != (CONFIG.get('stream_url1'), CONFIG.get('stream_url2'))
+        profile = CONFIG.get('latency_profile')
+    ENGINE.set_profile(profile)
+    if links_changed:
+        _links_changed()
+
+
+CONFIG_WATCH = config_watch.watch(CONFIG_PATH)
+CONFIG_WATCH.on_change(_config_file_changed)
 
 
 def update_config(**updates):
@@ -111,189 +196,131 @@ def parse_request_payload():
             app.logger.warning('Invalid JSON payload: %s', raw[:200])
     return {}
 
-def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'logged_in' not in session:
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
-
 def stop_player():
-    global PLAYER_PROC
-    try:
-        if PLAYER_PROC and PLAYER_PROC.poll() is None:
-            PLAYER_PROC.terminate()
-            try:
-                PLAYER_PROC.wait(timeout=1)
-            except Exception:
-                pass
-        # Do not kill background decoders; only stop active output
-        pass
-    except Exception:
-        pass
-    PLAYER_PROC = None
-    try:
-        # Kill any lingering output processes to DAC (keep background decoders)
-        subprocess.run(['pkill','-f','cvlc.*--alsa-audio-device=hw:0,0'], check=False)
-        subprocess.run(['pkill','-f','vlc.*--alsa-audio-device=hw:0,0'], check=False)
-        subprocess.run(['pkill','-f','aplay.*-D\s*hw:0,0'], check=False)
-    except Exception:
-        pass
+    # Stop the engine's output stage (and its sink process); link decoders keep running
+    ENGINE.stop()
+
+def stop_test(gen: int = None):
+    """Stop the test tone; with `gen` (from a tone's own timer) only if that tone is still the current one."""
+    global TEST_THREAD
+    with TEST_LOCK:
+        if not CONTROLLER.end_test(gen) and gen is not None:
+            return
+        # The tone player runs in its own process group under the supervisor
+        TEST_STOP.set()
+        SUPERVISOR.stop('test')
+        if TEST_THREAD is not None:
+            TEST_THREAD.join(timeout=1)
+            TEST_THREAD = None
+
+def _testing() -> bool:
+    if not CONTROLLER.snapshot.test_gen:
+        return False
+    feeder = TEST_THREAD
+    return SUPERVISOR.running('test') or (feeder is not None and feeder.is_alive())
 
-def stop_test():
-    global TEST_PROC
-    try:
-        if TEST_PROC and TEST_PROC.poll() is None:
-            TEST_PROC.terminate()
-            try:
-                TEST_PROC.wait(timeout=1)
-            except Exception:
-                pass
-        subprocess.run(['pkill','-f','test_pcm5102a'], check=False)
-        subprocess.run(['pkill','-f','simple_test'], check=False)
-        subprocess.run(['pkill','-f','speaker-test'], check=False)
-    except Exception:
-        pass
-    TEST_PROC = None
+def _slot_for(url: str):
+    """Engine input slot for `url`: its link index if configured, else 0 for ad-hoc URLs."""
+    for idx, u in enumerate(_configured_urls(), 1):
+        if u and u == url:
+            return idx
+    return 0
+
+def _drop_adhoc() -> None:
+    """An ad-hoc URL (slot 0) is only decoded while on air; once off air nothing can switch back to it."""
+    if ENGINE.active_idx != 0:
+        ENGINE.drop_input(0)
 
 def start_player(url: str, out_dev: str = 'hw:0,0', volume: int = 100) -> bool:
-    global PLAYER_PROC, CURRENT_VOLUME
-    stop_player()
+    global CURRENT_VOLUME
     CURRENT_VOLUME = volume
-    
-    # Try VLC first (supports most codecs: MP3, OGG, WAV, AAC, FLAC, etc.)
-    cvlc = shutil.which('cvlc') or '/usr/bin/cvlc'
-    if os.path.exists(cvlc):
-        try:
-            vol_percent = int(volume * 256 / 100)  # VLC volume 0-256
-            vol_percent = max(0, min(256, vol_percent))
-            PLAYER_PROC = subprocess.Popen([
-                cvlc, '--intf','dummy','--no-video','--quiet',
-                '--aout','alsa', f'--alsa-audio-device={out_dev}',
-                '--network-caching','8000','--live-caching','12000',
-                '--volume', str(vol_percent),
-                url
-            ], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            time.sleep(1.5)
-            if PLAYER_PROC.poll() is None:
-                return True
-        except Exception:
-            pass
-    
-    # Fallback: ffmpeg -> aplay (supports many formats)
-    ffmpeg = shutil.which('ffmpeg') or '/usr/bin/ffmpeg'
-    aplay = shutil.which('aplay') or '/usr/bin/aplay'
-    if os.path.exists(ffmpeg) and os.path.exists(aplay):
-        try:
-            vol_gain = 20 * (volume / 100) - 20  # Volume in dB
-            PLAYER_PROC = subprocess.Popen([
-                ffmpeg,'-nostdin','-reconnect','1','-reconnect_streamed','1',
-                '-reconnect_delay_max','10', '-i', url,
-                '-f','s16le','-ac','2','-ar','44100',
-                '-af',f'volume={vol_gain}dB','-'
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            ap = subprocess.Popen([aplay,'-D',out_dev,'-f','cd','-c','2','-r','44100'], 
-                                stdin=PLAYER_PROC.stdout)
-            PLAYER_PROC.stdout.close()
-            time.sleep(1.5)
-            if PLAYER_PROC.poll() is None and ap.poll() is None:
-                return True
-        except Exception:
-            pass
-    
-    # Fallback: mpg123 for MP3 streams
-    mpg123 = shutil.which('mpg123') or '/usr/bin/mpg123'
-    if os.path.exists(mpg123):
-        try:
-            vol_db = 20 * (volume / 100) - 20
-            PLAYER_PROC = subprocess.Popen([
-                mpg123,'-q','-g', str(vol_db), url
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            ap = subprocess.Popen([aplay,'-D',out_dev,'-f','cd','-c','2','-r','44100'], 
-                                stdin=PLAYER_PROC.stdout)
-            PLAYER_PROC.stdout.close()
-            time.sleep(1.5)
-            if PLAYER_PROC.poll() is None and ap.poll() is None:
-                return True
-        except Exception:
-            pass
-    
+    if not playback_engine.available():
+        app.logger.warning('No decoder (ffmpeg/mpg123) or sink (aplay/pyalsaaudio) available')
+        return False
+    # One decoder per link feeding the in-process output stage; if the output is
+    # already running this is a live switch of input, device and gain
+    idx = _slot_for(url)
+    ENGINE.set_input(idx, url)
+    ENGINE.start(idx, out_dev, volume)
+    # Resolves as soon as decoded audio reaches the sink, or the decoder/sink fails
+    if ENGINE.wait_audio(playback_engine.FIRST_AUDIO_TIMEOUT_S):
+        if idx != 0:
+            _drop_adhoc()
+        return True
+    inp = ENGINE.inputs.get(idx)
+    error = ENGINE.sink_error or (inp.last_error if inp else None) or 'timed out'
+    app.logger.warning('No audio from %s: %s', url, error)
+    CONTROLLER.update(error=error)
     stop_player()
     return False
 
+def _command(state: str, fn, *args) -> dict:
+    """Run player command `fn` in `state`; afterwards the controller is playing or idle, per the engine."""
+    # a fresh command starts without the previous one's error, so only its own cause is reported
+    CONTROLLER.transition(state, enabled=True, error=None)
+    seq = CONTROLLER.snapshot.seq
+    result = {'success': False}
+    try:
+        result = fn(*args)
+    finally:
+        snap = CONTROLLER.snapshot
+        # the cause recorded while running (e.g. the decoder's error) beats the command's generic message
+        error = (snap.error if snap.seq > seq else None) or result.get('message')
+        if snap.state != state or not snap.enabled:
+            # preempted by a stop while running: make sure nothing is left on air
+            if not snap.enabled and ENGINE.running:
+                stop_player()
+        elif ENGINE.running:
+            CONTROLLER.transition(playback_controller.PLAYING, active_idx=ENGINE.active_idx,
+                                  error=None if result.get('success') else error,
+                                  fail_count=0 if result.get('success') else snap.fail_count)
+        else:
+            CONTROLLER.transition(playback_controller.IDLE, error=error or 'failed to start')
+    return result
+
 def start_test_tone(frequency: int = 440, duration: int = 5, device: str = 'hw:0,0', volume: int = 100) -> bool:
-    global TEST_PROC
-    stop_test()
-    
-    # Try using speaker-test (ALSA utility)
-    speaker_test = shutil.which('speaker-test') or '/usr/bin/speaker-test'
-    if os.path.exists(speaker_test):
+    global TEST_THREAD, TEST_STOP
+    with TEST_LOCK:
+        stop_test()
+        gen = CONTROLLER.begin_test()
+        
+        # Try using speaker-test (ALSA utility)
+        speaker_test = shutil.which('speaker-test') or '/usr/bin/speaker-test'
+        if os.path.exists(speaker_test):
+            try:
+                # speaker-test generates sine wave tones
+                proc = SUPERVISOR.spawn('test', [
+                    speaker_test, '-t', 'sine', '-f', str(frequency),
+                    '-c', '2', '-s', '1', '-D', device, '-l', '1'
+                ], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                time.sleep(0.5)
+                if proc.poll() is None:
+                    # Schedule stop after duration (a no-op if another tone replaced this one)
+                    def stop_after_delay():
+                        time.sleep(duration)
+                        stop_test(gen)
+                    threading.Thread(target=stop_after_delay, daemon=True).start()
+                    return True
+            except Exception:
+                pass
+        
+        # Fallback: stream a synthesized tone straight into the sink (no temp file)
         try:
-            # speaker-test generates sine wave tones
-            vol_pct = volume
-            TEST_PROC = subprocess.Popen([
-                speaker_test, '-t', 'sine', '-f', str(frequency),
-                '-c', '2', '-s', '1', '-D', device, '-l', '1'
-            ], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            time.sleep(0.5)
-            if TEST_PROC.poll() is None:
-                # Schedule stop after duration
-                def stop_after_delay():
-                    time.sleep(duration)
-                    stop_test()
-                import threading
-                threading.Thread(target=stop_after_delay, daemon=True).start()
+            sink = pcm_sink.make_sink(device, tone_engine.RATE, 2, name='test')
+            sink.open()
+            blocks = tone_engine.tone_blocks(frequency, duration, volume / 100, tone_engine.RATE, 2)
+            TEST_STOP = threading.Event()
+            TEST_THREAD = threading.Thread(target=pcm_sink.play, args=(sink, blocks, TEST_STOP), daemon=True)
+            TEST_THREAD.start()
+            # a bad device makes aplay exit right away, which ends the stream
+            TEST_THREAD.join(0.3)
+            if TEST_THREAD.is_alive():
                 return True
         except Exception:
             pass
-    
-    # Fallback: Use Python to generate tone and pipe to aplay
-    try:
-        import math
-        import wave
-        import tempfile
-        
-        sample_rate = 44100
-        num_samples = int(sample_rate * duration)
-        amplitude = int(32767 * volume / 100)
-        
-        # Generate sine wave
-        samples = []
-        for i in range(num_samples):
-            value = int(amplitude * math.sin(2 * math.pi * frequency * i / sample_rate))
-            samples.append(struct.pack('<hh', value, value))  # Stereo 16-bit
         
-        # Write to temporary WAV file
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
-            temp_wav = f.name
-            with wave.open(temp_wav, 'wb') as w:
-                w.setnchannels(2)
-                w.setsampwidth(2)
-                w.setframerate(sample_rate)
-                w.writeframes(b''.join(samples))
-        
-        # Play with aplay
-        aplay = shutil.which('aplay') or '/usr/bin/aplay'
-        if os.path.exists(aplay):
-            TEST_PROC = subprocess.Popen([aplay, '-D', device, temp_wav],
-                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            time.sleep(0.5)
-            if TEST_PROC.poll() is None:
-                def cleanup():
-                    TEST_PROC.wait()
-                    try:
-                        os.unlink(temp_wav)
-                    except:
-                        pass
-                import threading
-                threading.Thread(target=cleanup, daemon=True).start()
-                return True
-    except Exception as e:
-        pass
-    
-    stop_test()
-    return False
+        stop_test()
+        return False
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -301,9 +328,7 @@ def login():
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
         
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        
-        if username == ADMIN_USERNAME and password_hash == ADMIN_PASSWORD_HASH:
+        if auth.check_credentials(username, password):
             session['logged_in'] = True
             session['username'] = username
             return redirect(url_for('index'))
@@ -322,12 +347,36 @@ def logout():
 def index():
     return render_template('index.html', session=session, config=CONFIG)
 
+JOB_WAIT_S = 15.0
+
+
+def _submit(kind: str, fn, *args):
+    """Queue a player command; `?wait=1` keeps the old blocking behaviour for scripts."""
+    job = JOBS.submit(kind, fn, *args)
+    if request.args.get('wait') in ('1', 'true'):
+        if job.done.wait(JOB_WAIT_S) and isinstance(job.result, dict):
+            return jsonify(job=job.id, **job.result)
+        return jsonify(success=False, job=job.id, message=job.error or 'still running'), 202
+    return jsonify(success=True, queued=True, job=job.as_dict()), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def api_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify(success=False, message='unknown job'), 404
+    return jsonify(success=True, job=job.as_dict())
+
+def _do_start(url: str, out: str, volume: int) -> dict:
+    update_config(is_playing=True)
+    ok = start_player(url, out, volume)
+    if ok:
+        update_config(stream_url=url, device=out, volume=volume)
+    return {'success': ok, 'message': 'Started' if ok else 'Failed to start'}
+
 @app.route('/api/start', methods=['POST'])
 @login_required
 def api_start():
-    global PLAYBACK_ENABLED
-    PLAYBACK_ENABLED = True
-    update_config(is_playing=True)
     try:
         data = parse_request_payload()
         if not data:
@@ -340,43 +389,28 @@ def api_start():
         if not url:
             return jsonify(success=False, message='Missing url'), 400
         
-        ok = start_player(url, out, volume)
-        if ok:
-            update_config(stream_url=url, device=out, volume=volume)
-        return jsonify(success=ok, message='Started' if ok else 'Failed to start')
+        return _submit('start', _command, playback_controller.STARTING, _do_start, url, out, volume)
     except Exception as e:
         return jsonify(success=False, message=str(e)), 500
 
 
 
 def stop_all():
-    global PLAYBACK_ENABLED
-    PLAYBACK_ENABLED = False
-    update_config(is_playing=False)
-    # stop output player
-    stop_player()
-    # stop background decoders
+    CONTROLLER.transition(playback_controller.STOPPING, enabled=False)
     try:
-        for i, proc in list(BG_PROCS.items()):
-            try:
-                if proc and proc.poll() is None:
-                    proc.terminate()
-            except Exception:
-                pass
-            BG_PROCS[i] = None
-    except Exception:
-        pass
-    # ensure any lingering bg processes are gone
-    try:
-        subprocess.run(['pkill','-f','cvlc.*--aout\s*dummy'], check=False)
-        subprocess.run(['pkill','-f','ffmpeg .* -f null -'], check=False)
-        subprocess.run(['pkill','-f','curl -L --fail --silent --show-error'], check=False)
-    except Exception:
-        pass
+        update_config(is_playing=False)
+        # stop output player
+        stop_player()
+        # stop background decoders; each one is reaped by the supervisor, no pkill sweep needed
+        ENGINE.shutdown()
+    finally:
+        CONTROLLER.transition(playback_controller.IDLE, fail_count=0)
 
 @app.route('/api/stop', methods=['POST'])
 @login_required
 def api_stop():
+    # Stop wins over anything still queued; a running start fails fast once the engine is down
+    JOBS.cancel_pending()
     stop_all()
     return jsonify(success=True)
 
@@ -423,79 +457,142 @@ def api_volume():
         volume = int(data.get('volume', 100))
         volume = max(0, min(100, volume))
         
-        global CURRENT_VOLUME, PLAYER_PROC
+        global CURRENT_VOLUME
         CURRENT_VOLUME = volume
         update_config(volume=volume)
+        # Ramped in by the engine's output stage; returns once the new gain reached the sink
+        applied = ENGINE.set_volume(volume, timeout=0.5)
         
-        # Try to change volume on running player (requires restart for most players)
-        if PLAYER_PROC and PLAYER_PROC.poll() is None:
-            # VLC volume control via dbus or restart needed
-            # For now, just store volume for next start
-            pass
-        
-        return jsonify(success=True, volume=volume)
+        return jsonify(success=True, volume=volume, applied=applied)
     except Exception as e:
         return jsonify(success=False, message=str(e)), 500
 
+def _active_idx(snap) -> int:
+    """The slot on air per the engine, else the last one the controller played, else the configured one."""
+    if ENGINE.running and ENGINE.active_idx is not None:
+        return ENGINE.active_idx
+    if snap.active_idx is not None:
+        return snap.active_idx
+    return int(CONFIG.get('current_stream_idx', 1) or 1)
+
+def _status_payload() -> dict:
+    is_running = ENGINE.running
+    is_testing = _testing()
+    snap = CONTROLLER.snapshot
+    buffers = ENGINE.buffer_status()
+    active = ENGINE.active_idx
+    return {
+        'playing': is_running,
+        'state': snap.state,
+        'error': snap.error,
+        'testing': is_testing,
+        'volume': CURRENT_VOLUME,
+        'active_idx': _active_idx(snap),
+        'time_to_first_audio_ms': None if ENGINE.ttfa is None else round(ENGINE.ttfa * 1000),
+        'fault': ENGINE.fault,
+        'latency_profile': ENGINE.profile.name,
+        'buffer_ms': (buffers.get(active) or {}).get('depth_ms'),
+        'buffer_target_ms': (buffers.get(active) or {}).get('target_ms'),
+        'drift_ppm': {f'l{idx}': b['drift_ppm'] for idx, b in buffers.items()},
+        'buffers': {str(idx): b for idx, b in buffers.items()},
+    }
+
 @app.route('/api/status', methods=['GET'])
 @login_required
 def api_status():
-    is_running = PLAYER_PROC is not None and PLAYER_PROC.poll() is None
-    is_testing = TEST_PROC is not None and TEST_PROC.poll() is None
-    return jsonify({
-        'playing': is_running,
-        'testing': is_testing,
-        'volume': CURRENT_VOLUME
-    })
+    return jsonify(_status_payload())
+
+@app.route('/api/processes', methods=['GET'])
+@login_required
+def api_processes():
+    return jsonify(success=True, processes=SUPERVISOR.stats(), relay=RELAY.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # unauthenticated for scrapers; labels carry link numbers, never stream URLs
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/levels')
 @login_required
 def api_levels():
+    # only configured links are metered (a persistent decoder each); other URLs get 404
     try:
         url = request.args.get('url','').strip()
         url = normalize_url(url)
         if not url:
             return jsonify(success=False, message='missing url'), 400
-        import subprocess, array, os, math, shutil
-        ff = shutil.which('ffmpeg') or '/usr/bin/ffmpeg'
-        if not os.path.exists(ff):
+        configured = _configured_urls()
+        if url not in configured:
+            return jsonify(success=False, message='url not configured'), 404
+        for idx, link in enumerate(configured, 1):
+            levels = ENGINE.input_levels(idx, url) if link == url else None
+            if levels is not None:
+                return jsonify(success=True, **levels)
+        if not os.path.exists(meter_service.FFMPEG):
             return jsonify(success=False, message='ffmpeg missing'), 500
-        proc = subprocess.Popen([ff,'-hide_banner','-loglevel','error','-t','0.15','-vn','-sn','-dn','-i',url,
-                                 '-f','s16le','-ac','2','-ar','16000','-'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        data = proc.stdout.read(16000*2*2//6) if proc.stdout else b''
-        try: proc.terminate()
-        except Exception: pass
-        if not data:
-            return jsonify(success=True, L=0.0, R=0.0)
-        samples = array.array('h'); samples.frombytes(data)
-        n=len(samples)//2
-        if n<=0:
-            return jsonify(success=True, L=0.0, R=0.0)
-        peakL=peakR=0
-        for i in range(0,n*2,2):
-            a=abs(samples[i]); b=abs(samples[i+1])
-            if a>peakL: peakL=a
-            if b>peakR: peakR=b
-        def to_dbfs(pk):
-            import math
-            return round(20*math.log10(max(1e-6, pk/32767.0)),1)
-        return jsonify(success=True, L_db=to_dbfs(peakL), R_db=to_dbfs(peakR))
+        METERS.retain(configured)
+        return jsonify(success=True, **METERS.levels(url))
     except Exception as e:
         return jsonify(success=False, message=str(e)), 500
 
+def _output_levels():
+    j = ENGINE.levels() if ENGINE.running else None
+    if j is None:
+        j = OUTPUT_LEVELS.read()
+    if j is None:
+        # no level bus (e.g. no /dev/shm); fall back to the json export
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'levels.json')
+        with open(path, 'r', encoding='utf-8') as f:
+            j = json.load(f)
+    return j
+
 @app.route('/api/output_levels')
 @login_required
 def api_output_levels():
     try:
-        import json, os, time
-        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'levels.json')
-        with open(path, 'r', encoding='utf-8') as f:
-            j = json.load(f)
-        return jsonify(success=True, levels=j)
+        return jsonify(success=True, levels=_output_levels())
     except Exception as e:
         return jsonify(success=False, message=str(e)), 500
 
 
+def _levels_payload() -> dict:
+    frame = {}
+    try:
+        frame['out'] = _output_levels()
+    except Exception:
+        frame['out'] = None
+    for idx in (1, 2):
+        url = normalize_url(CONFIG.get(f'stream_url{idx}', ''))
+        # a link the engine decodes is metered there; a separate meter decoder only for the others
+        levels = ENGINE.input_levels(idx, url) if url else None
+        if levels is None and url and os.path.exists(meter_service.FFMPEG):
+            levels = METERS.levels(url)
+        frame[f'l{idx}'] = levels
+    return frame
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    try:
+        min_interval = float(request.args.get('interval', 0.25))
+    except ValueError:
+        min_interval = 0.25
+    sub = EVENTS.subscribe(max(0.1, min(5.0, min_interval)))
+    if sub is None:
+        return jsonify(success=False, message='too many event clients'), 503
+    return Response(stream_with_context(EVENTS.stream(sub)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _do_switch(url: str, out: str) -> dict:
+    ok = start_player(url, out)
+    if ok:
+        try:
+            update_config(stream_url=url)
+        except Exception:
+            pass
+    return {'success': ok}
+
 @app.route('/api/switch', methods=['POST'])
 @login_required
 def api_switch():
@@ -505,14 +602,7 @@ def api_switch():
         out = 'hw:0,0'
         if not url:
             return jsonify(success=False, message='No url2 provided'), 400
-        stop_player()
-        ok = start_player(url, out)
-        if ok:
-            try:
-                update_config(stream_url=url)
-            except Exception:
-                pass
-        return jsonify(success=ok)
+        return _submit('switch', _command, playback_controller.STARTING, _do_switch, url, out)
     except Exception as e:
         return jsonify(success=False, message=str(e)), 500
 
@@ -520,7 +610,8 @@ def api_switch():
 @login_required
 def api_config():
     if request.method == 'GET':
-        return jsonify(success=True, config=CONFIG)
+        return jsonify(success=True, config=CONFIG, version=CONFIG_STORE.version,
+                       persisted=not CONFIG_STORE.dirty)
     data = parse_request_payload()
     if not data:
         return jsonify(success=False, message='Missing request body'), 400
@@ -541,8 +632,18 @@ def api_config():
         updates['test_duration'] = max(1, min(60, int(data.get('test_duration', 5))))
     if 'test_device' in data:
         updates['test_device'] = data.get('test_device', '').strip() or 'hw:0,0'
+    if 'latency_profile' in data:
+        profile = str(data.get('latency_profile', '')).strip()
+        if profile not in jitter_buffer.PROFILES:
+            return jsonify(success=False, message='unknown latency profile'), 400
+        updates['latency_profile'] = profile
     new_config = update_config(**updates)
-    return jsonify(success=True, config=new_config)
+    version = CONFIG_STORE.version
+    if 'latency_profile' in updates:
+        ENGINE.set_profile(updates['latency_profile'])
+    if 'stream_url1' in updates or 'stream_url2' in updates:
+        _links_changed()
+    return jsonify(success=True, config=new_config, version=version)
 
 
 def get_active_url() -> str:
@@ -553,64 +654,102 @@ def get_active_url() -> str:
         u = CONFIG.get('stream_url2', '')
     return normalize_url(u)
 
+def _do_toggle() -> dict:
+    update_config(is_playing=True)
+    # read the current link here, not in the handler, so queued toggles alternate correctly
+    cur = int(CONFIG.get('current_stream_idx', 1) or 1)
+    new_idx = 2 if cur == 1 else 1
+    url = CONFIG.get('stream_url1','') if new_idx == 1 else CONFIG.get('stream_url2','')
+    url = normalize_url(url)
+    if not url:
+        return {'success': False, 'message': 'No link configured', 'active_idx': cur}
+    update_config(current_stream_idx=new_idx)
+    ok = _switch_output(new_idx)
+    if not ok:
+        ok = start_player(url, CONFIG.get('device','hw:0,0'), int(CONFIG.get('volume', 100)))
+    if ok:
+        update_config(stream_url=url)
+    return {'success': ok, 'active_idx': new_idx}
+
 @app.route('/api/toggle', methods=['POST'])
 @login_required
 def api_toggle():
-    global PLAYBACK_ENABLED
-    PLAYBACK_ENABLED = True
-    update_config(is_playing=True)
     try:
-        cur = int(CONFIG.get('current_stream_idx', 1) or 1)
-        new_idx = 2 if cur == 1 else 1
-        update_config(current_stream_idx=new_idx)
-        url = CONFIG.get('stream_url1','') if new_idx == 1 else CONFIG.get('stream_url2','')
-        url = normalize_url(url)
-        if not url:
-            return jsonify(success=False, message='No link configured'), 400
-        stop_player()
-        ok = start_player(url, CONFIG.get('device','hw:0,0'), int(CONFIG.get('volume', 100)))
-        if ok:
-            update_config(stream_url=url)
-        return jsonify(success=ok, active_idx=new_idx)
+        return _submit('toggle', _command, playback_controller.STARTING, _do_toggle)
     except Exception as e:
         return jsonify(success=False, message=str(e)), 500
 
 
-from urllib.request import urlopen, Request
-from urllib.error import URLError, HTTPError
+def _configured_urls():
+    return [normalize_url(CONFIG.get('stream_url1','')), normalize_url(CONFIG.get('stream_url2',''))]
 
-def _health_of(url: str, timeout: float = 2.0) -> bool:
-    try:
-        if not url:
-            return False
-        req = Request(url, headers={'User-Agent':'Mozilla/5.0'})
-        with urlopen(req, timeout=timeout) as r:
-            r.read(512)
-        return True
-    except Exception:
-        return False
+# one upstream connection per configured link, shared by decoders, meters and health checks
+RELAY = stream_relay.StreamRelay(_configured_urls)
 
 
-def _bg_running_for_url(url: str) -> bool:
-    if not url:
-        return False
-    try:
-        out = _sp.check_output(['pgrep','-af','ffmpeg'], text=True)
-        for line in out.splitlines():
-            if url in line and ' -f null -' in line:
-                return True
-    except Exception:
-        pass
-    return False
+def _probe(url: str, timeout: float):
+    # the relay's connection already tells whether the link delivers data
+    res = RELAY.result(url)
+    return res if res is not None else link_prober.probe(url, timeout)
 
-@app.route('/api/link_health', methods=['GET'])
 
+PROBER = link_prober.LinkProber(_configured_urls, probe_fn=_probe)
+
+
+def _links_changed():
+    RELAY.sync()
+    PROBER.refresh()
+    # decoders still on an edited link's old URL must not stay switchable
+    for idx, url in enumerate(_configured_urls(), 1):
+        inp = ENGINE.inputs.get(idx)
+        if inp is None or inp.url == url:
+            continue
+        if url:
+            ENGINE.set_input(idx, url)
+        else:
+            ENGINE.drop_input(idx)
+
+def _health_of(url: str) -> bool:
+    """Cached health of a configured link (see link_prober); never blocks."""
+    return PROBER.healthy(url)
+
+
+def _link_health_payload() -> dict:
+    u1, u2 = _configured_urls()
+    return {'l1': _health_of(u1), 'l2': _health_of(u2)}
+
+@app.route('/api/link_health', methods=['GET'])
 @login_required
 def api_link_health():
-    u1 = CONFIG.get('stream_url1','')
-    u2 = CONFIG.get('stream_url2','')
-    return jsonify(success=True, l1=_health_of(normalize_url(u1) if u1 else ''), l2=_health_of(normalize_url(u2) if u2 else ''))
-
+    details = {}
+    for idx, url in enumerate(_configured_urls(), 1):
+        res = PROBER.result(url) if url else None
+        details[f'l{idx}'] = None if res is None else {
+            'ok': res.ok, 'status': res.status, 'latency_ms': res.latency_ms,
+            'ttfb_ms': res.ttfb_ms, 'error': res.error,
+            'age_s': round(time.monotonic() - res.checked_at, 1),
+        }
+    return jsonify(success=True, details=details, **_link_health_payload())
+
+
+EVENTS.add_source('levels', _levels_payload, every=0.3)
+EVENTS.add_source('status', _status_payload, every=0.5, on_change=True)
+# transitions are pushed immediately rather than at the next status sample
+CONTROLLER.on_change(lambda snap: EVENTS.publish('status', _status_payload()))
+EVENTS.add_source('health', _link_health_payload, every=1.0, on_change=True)
+
+metrics.REGISTRY.gauge('output_running', 'Whether the output stage is on air.', fn=lambda: int(ENGINE.running))
+metrics.REGISTRY.gauge('playback_state', 'Current playback controller state (1 for the active one).', ('state',),
+                       fn=lambda: {(s,): int(CONTROLLER.snapshot.state == s) for s in playback_controller.TRANSITIONS})
+metrics.REGISTRY.gauge('link_healthy', 'Cached health probe result per link.', ('link',),
+                       fn=lambda: {(f'l{i}',): int(_health_of(u)) for i, u in enumerate(_configured_urls(), 1) if u})
+metrics.REGISTRY.gauge('drift_ppm', 'Learned clock drift of each link against the DAC (positive: source faster).',
+                       ('link',), fn=lambda: {(f'l{idx}',): b['drift_ppm'] for idx, b in ENGINE.buffer_status().items()})
+metrics.REGISTRY.gauge('drift_correction_ppm', 'Playback rate correction currently applied to the link on air.',
+                       fn=lambda: (ENGINE.buffer_status().get(ENGINE.active_idx) or {}).get('correction_ppm')
+                       if ENGINE.running else None)
+metrics.REGISTRY.gauge('jobs_pending', 'Player commands queued or running.', fn=lambda: len(JOBS.pending()))
+metrics.REGISTRY.gauge('event_clients', 'Connected SSE clients.', fn=EVENTS.clients)
 
 
 def _start_bg_for(idx: int) -> bool:
@@ -618,51 +757,18 @@ def _start_bg_for(idx: int) -> bool:
     url = normalize_url(url)
     if not url:
         return False
-    import shutil, subprocess, os
-    # Try cvlc with dummy output (no DAC usage)
-    cvlc = shutil.which('cvlc') or '/usr/bin/cvlc'
-    if os.path.exists(cvlc):
-        try:
-            proc = subprocess.Popen([cvlc,'--intf','dummy','--no-video','--quiet','--aout','dummy',url], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            BG_PROCS[idx] = proc
-            import time as _t
-            _t.sleep(0.2)
-            if proc.poll() is None:
-                return True
-        except Exception:
-            pass
-    # Fallback to ffmpeg to null
-    ff = shutil.which('ffmpeg') or '/usr/bin/ffmpeg'
-    if os.path.exists(ff):
-        try:
-            proc = subprocess.Popen([ff,'-hide_banner','-loglevel','error','-reconnect','1','-reconnect_streamed','1','-reconnect_delay_max','10','-i',url,'-f','null','-'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            BG_PROCS[idx] = proc
-            import time as _t
-            _t.sleep(0.2)
-            if proc.poll() is None:
-                return True
-        except Exception:
-            pass
-    # Fallback: curl
-    curl = shutil.which('curl') or '/usr/bin/curl'
-    if os.path.exists(curl):
-        try:
-            proc = subprocess.Popen([curl,'-L','--fail','--silent','--show-error',url], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            BG_PROCS[idx] = proc
-            return True
-        except Exception:
-            pass
-    return False
+    if not playback_engine.available():
+        return False
+    # Decode to PCM in the engine so this link can be switched to without a cold start
+    ENGINE.set_input(idx, url)
+    inp = ENGINE.inputs.get(idx)
+    return inp is not None and inp.spawned.wait(playback_engine.SPAWN_TIMEOUT_S)
 
 
 def _stop_bg_for(idx: int) -> bool:
-    proc = BG_PROCS.get(idx)
-    if proc and proc.poll() is None:
-        try:
-            proc.terminate()
-        except Exception:
-            pass
-    BG_PROCS[idx] = None
+    # never pull the link that is currently on air
+    if idx != ENGINE.active_idx or not ENGINE.running:
+        ENGINE.drop_input(idx)
     return True
 
 @app.route('/api/link/<int:idx>/start_bg', methods=['POST'])
@@ -683,8 +789,16 @@ def api_link_stop_bg(idx: int):
 FAILOVER_INTERVAL_S = 3
 FAILOVER_FAILCOUNT = 3
 
-_last_ok = 0
-_fail_count = 0
+def _switch_output(idx: int) -> bool:
+    """Hitless switch to link `idx` if the engine is on air and that link is decoding its configured URL."""
+    inp = ENGINE.inputs.get(idx)
+    if inp is None or inp.url != _configured_urls()[idx - 1]:
+        return False    # the caller cold-starts the configured URL instead
+    if not (ENGINE.running and ENGINE.select(idx)):
+        return False
+    _drop_adhoc()
+    return True
+
 
 def _active_url_and_other():
     idx = int(CONFIG.get('current_stream_idx', 1) or 1)
@@ -693,72 +807,143 @@ def _active_url_and_other():
     return idx, a, b
 
 
+def _stop_if_disabled() -> dict:
+    # re-checked on the job worker: a start queued meanwhile may have re-enabled playback
+    if not CONTROLLER.snapshot.enabled:
+        stop_player()
+    return {'success': True}
+
+
+def _do_failover(idx: int, other: str) -> dict:
+    # Flip active
+    new_idx = 2 if idx == 1 else 1
+    update_config(current_stream_idx=new_idx)
+    ok = _switch_output(new_idx)
+    if not ok:
+        ok = start_player(other, CONFIG.get('device','hw:0,0'), int(CONFIG.get('volume',100)))
+    if ok:
+        update_config(stream_url=other)
+    return {'success': ok, 'active_idx': new_idx}
+
+
+def _failover(from_idx: int) -> dict:
+    snap = CONTROLLER.snapshot
+    idx, active, other = _active_url_and_other()
+    if idx != from_idx or not snap.enabled:
+        return {'success': False, 'message': 'superseded'}
+    if snap.state != playback_controller.PLAYING:
+        # nothing on air to rescue; an idle box must not be cold-started on the other link
+        return {'success': False, 'message': 'not playing'}
+    state = playback_controller.FAILING_OVER
+    t0 = time.monotonic()
+    result = {'success': False}
+    try:
+        result = _command(state, _do_failover, idx, other)
+    finally:
+        FAILOVER_SECONDS.observe(time.monotonic() - t0)
+        FAILOVERS.inc(result='ok' if result.get('success') else 'failed')
+    return result
+
+
+def _on_engine_fault(slot, reason: str):
+    """Watchdog fault on the link on air: fail over now rather than after FAILOVER_FAILCOUNT probes."""
+    app.logger.warning('Link %s on air: %s', slot, reason)
+    snap = CONTROLLER.snapshot
+    if not snap.enabled or snap.state != playback_controller.PLAYING:
+        return
+    idx, active, other = _active_url_and_other()
+    other_idx = 2 if idx == 1 else 1
+    if slot != idx or not other:
+        return
+    # the standby decoder is the best witness; fall back to its probe if it isn't running
+    if ENGINE.input_ok(other_idx) or (other_idx not in ENGINE.inputs and _health_of(other)):
+        JOBS.submit('failover', _failover, idx)
+
+
 def monitor_active_loop():
-    global _last_ok, _fail_count
     import time
     while True:
         try:
-            if not PLAYBACK_ENABLED:
-                stop_player()
+            if not CONTROLLER.snapshot.enabled:
+                if ENGINE.running:
+                    JOBS.submit('stop', _stop_if_disabled)
+                time.sleep(FAILOVER_INTERVAL_S)
+                continue
+            snap = CONTROLLER.snapshot
+            if snap.state == playback_controller.PLAYING and not ENGINE.running:
+                # only if no command moved the controller on since `snap` was taken
+                CONTROLLER.transition(playback_controller.IDLE, expect=playback_controller.PLAYING,
+                                      expect_seq=snap.seq, error=ENGINE.sink_error or 'output stopped')
+            if CONTROLLER.snapshot.state != playback_controller.PLAYING:
+                # only a link on air is failed over; an idle box stays silent
                 time.sleep(FAILOVER_INTERVAL_S)
                 continue
             idx, active, other = _active_url_and_other()
             ok = _health_of(active) if active else False
-            if ok:
-                _fail_count = 0
-            else:
-                _fail_count += 1
-                # If active failed repeatedly, try other if healthy
-                if _fail_count >= FAILOVER_FAILCOUNT:
-                    if other and _health_of(other):
-                        # Flip active
-                        new_idx = 2 if idx == 1 else 1
-                        update_config(current_stream_idx=new_idx)
-                        stop_player()
-                        if start_player(other, CONFIG.get('device','hw:0,0'), int(CONFIG.get('volume',100))):
-                            update_config(stream_url=other)
-                            _fail_count = 0
+            # If active failed repeatedly, try other if healthy
+            if CONTROLLER.record_health(ok) >= FAILOVER_FAILCOUNT:
+                if other and _health_of(other):
+                    # queued behind any user command, so it can't race a toggle or start
+                    job = JOBS.submit('failover', _failover, idx)
+                    job.done.wait(JOB_WAIT_S)
             time.sleep(FAILOVER_INTERVAL_S)
         except Exception:
             time.sleep(FAILOVER_INTERVAL_S)
 
-# Start monitor thread once at import
-def _start_monitor_once():
+_MONITOR = None
+
+
+def start_services():
+    """Start the link prober and the failover monitor (once per process).
+
+    Not done at import: only the process that owns the engine (the
+    playback daemon, or `python3 app.py`) may run them; importing this
+    module elsewhere must not start a second monitor fighting over the DAC.
+    """
+    global _MONITOR
+    if _MONITOR is not None:
+        return
     try:
-        t = threading.Thread(target=monitor_active_loop, daemon=True)
-        t.start()
+        RELAY.sync()
+        PROBER.start()
+        _MONITOR = threading.Thread(target=monitor_active_loop, name='failover-monitor', daemon=True)
+        _MONITOR.start()
     except Exception:
         pass
 
-_start_monitor_once()
 
+def _do_start_dual() -> dict:
+    update_config(is_playing=True)
+    # Start background decoders for both links if configured
+    _start_bg_for(1)
+    _start_bg_for(2)
+    # Route Link 1 to output by default
+    update_config(current_stream_idx=1)
+    url = normalize_url(CONFIG.get('stream_url1',''))
+    if not url:
+        # if link1 missing, try link2
+        update_config(current_stream_idx=2)
+        url = normalize_url(CONFIG.get('stream_url2',''))
+    if not url:
+        return {'success': False, 'message': 'No links configured'}
+    ok = start_player(url, CONFIG.get('device','hw:0,0'), int(CONFIG.get('volume',100)))
+    if ok:
+        update_config(stream_url=url)
+    return {'success': ok}
 
 @app.route('/api/start_dual', methods=['POST'])
 @login_required
 def api_start_dual():
-    global PLAYBACK_ENABLED
-    PLAYBACK_ENABLED = True
-    update_config(is_playing=True)
+    if not any(_configured_urls()):
+        return jsonify(success=False, message='No links configured'), 400
     try:
-        # Start background decoders for both links if configured
-        _start_bg_for(1)
-        _start_bg_for(2)
-        # Route Link 1 to output by default
-        update_config(current_stream_idx=1)
-        url = normalize_url(CONFIG.get('stream_url1',''))
-        if not url:
-            # if link1 missing, try link2
-            update_config(current_stream_idx=2)
-            url = normalize_url(CONFIG.get('stream_url2',''))
-        if not url:
-            return jsonify(success=False, message='No links configured'), 400
-        stop_player()
-        ok = start_player(url, CONFIG.get('device','hw:0,0'), int(CONFIG.get('volume',100)))
-        if ok:
-            update_config(stream_url=url)
-        return jsonify(success=ok)
+        return _submit('start_dual', _command, playback_controller.STARTING, _do_start_dual)
     except Exception as e:
         return jsonify(success=False, message=str(e)), 500
 
 if __name__ == '__main__':
+    # exit through SystemExit on SIGTERM so atexit flushes pending config writes
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # all-in-one development mode; production runs web.py under gunicorn plus playback_daemon.py
+    start_services()
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Login shared by the all-in-one app (app.py) and the stateless web workers (web.py).
+
+Both sign sessions with the same key, so a cookie issued by any gunicorn
+worker is accepted by every other one.
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, redirect, session, url_for
+
+SECRET_KEY = 'decoder-web-secret-key-change-in-production'
+
+# Default credentials
+ADMIN_USERNAME = 'admin'
+ADMIN_PASSWORD_HASH = hashlib.sha256('admin123'.encode()).hexdigest()
+
+# app.config flag: every request is already authenticated (the playback
+# daemon only listens on a local socket that the web workers connect to)
+TRUST_LOCAL = 'TRUST_LOCAL_SOCKET'
+
+
+def configure(app) -> None:
+    app.config['SECRET_KEY'] = SECRET_KEY
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+
+
+def check_credentials(username: str, password: str) -> bool:
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    return username == ADMIN_USERNAME and password_hash == ADMIN_PASSWORD_HASH
+
+
+def login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'logged_in' not in session and not current_app.config.get(TRUST_LOCAL):
+            return redirect(url_for('login'))
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: per-sample Python loop vs level_meter kernels (samples/sec)."""
+import sys
+import math
+import time
+import array
+
+import level_meter
+
+SAMPLE_RATE = 16000
+CHUNK_FR    = SAMPLE_RATE * 50 // 1000   # same 50 ms chunk as meter_service
+ROUNDS      = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+
+
+def make_chunk() -> bytes:
+    samples = array.array('h')
+    for i in range(CHUNK_FR):
+        v = int(20000 * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE))
+        samples.extend((v, -v // 2))
+    return samples.tobytes()
+
+
+def legacy_loop(data: bytes):
+    samples = array.array('h'); samples.frombytes(data)
+    sum_l = sum_r = 0.0
+    peak_l = peak_r = 0
+    n = len(samples)//2
+    for i in range(0, n*2, 2):
+        a = samples[i]
+        b = samples[i+1]
+        sum_l += a*a
+        sum_r += b*b
+        a = abs(a)
+        b = abs(b)
+        if a > peak_l: peak_l = a
+        if b > peak_r: peak_r = b
+    return math.sqrt(sum_l/n)/32767.0, math.sqrt(sum_r/n)/32767.0, peak_l, peak_r
+
+
+def bench(name: str, fn, data: bytes) -> None:
+    fn(data)
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(data)
+    dt = time.perf_counter() - t0
+    samples = ROUNDS * len(data) // 2
+    print(f'{name:<16} {samples/dt/1e6:8.2f} M samples/s  ({dt*1e6/ROUNDS:8.1f} us/chunk)')
+
+
+def main():
+    data = make_chunk()
+    print(f'{ROUNDS} rounds of {CHUNK_FR} stereo frames')
+    bench('python loop', legacy_loop, data)
+    bench('array/audioop', lambda d: level_meter._measure_array(d, 2), data)
+    if level_meter.np is not None:
+        bench('numpy', lambda d: level_meter._measure_numpy(d, 2), data)
+    else:
+        print('numpy            not installed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Debounced, coalescing, atomic persistence of a JSON document (config.json).
+
+Callers bump a version with mark_dirty() (cheap, safe under their own
+lock); a writer thread waits until updates have been quiet for DEBOUNCE_S
+(but never longer than MAX_DELAY_S after the first one) and then writes a
+single snapshot: temp file in the same directory, fsync, rename over the
+target, fsync of the directory. Readers therefore only ever see a whole
+old or a whole new file, and a burst of updates costs one write.
+"""
+import os
+import json
+import atexit
+import tempfile
+import threading
+import time
+
+DEBOUNCE_S = 0.2
+MAX_DELAY_S = 1.0
+
+
+def write_atomic(path: str, data) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+            json.dump(data, handle, indent=2)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    try:
+        dfd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+    except OSError:
+        pass
+
+
+class ConfigStore:
+    def __init__(self, path: str, snapshot, debounce_s: float = DEBOUNCE_S, max_delay_s: float = MAX_DELAY_S,
+                 on_error=None):
+        """`snapshot()` returns the document to write; it is called on the writer thread."""
+        self.path = path
+        self.snapshot = snapshot
+        self.debounce_s = debounce_s
+        self.max_delay_s = max_delay_s
+        self.on_error = on_error
+        self.version = 0            # bumped by every mark_dirty()
+        self.written_version = 0    # version contained in the file on disk
+        self.writes = 0
+        self._first_dirty = None
+        self._last_dirty = 0.0
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.flush)
+
+    @property
+    def dirty(self) -> bool:
+        return self.written_version != self.version
+
+    def mark_dirty(self) -> int:
+        """Schedule a write of the current document; returns the new version."""
+        with self._cond:
+            self.version += 1
+            now = time.monotonic()
+            self._last_dirty = now
+            if self._first_dirty is None:
+                self._first_dirty = now
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='config-store', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+            return self.version
+
+    def flush(self) -> bool:
+        """Write pending changes now (used on shutdown); returns False if the write failed."""
+        if not self.dirty:
+            return True
+        return self._write()
+
+    def _write(self) -> bool:
+        with self._write_lock:
+            with self._cond:
+                version = self.version
+                self._first_dirty = None
+            if version == self.written_version:
+                return True
+            try:
+                write_atomic(self.path, self.snapshot())
+            except Exception as err:
+                if self.on_error is not None:
+                    self.on_error(err)
+                return False
+            self.written_version = version
+            self.writes += 1
+            return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.dirty)
+                # coalesce: wait for a quiet gap, bounded by the max delay since the first update
+                while True:
+                    now = time.monotonic()
+                    first = self._first_dirty if self._first_dirty is not None else now
+                    due = min(self._last_dirty + self.debounce_s, first + self.max_delay_s)
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+            if not self._write():
+                time.sleep(self.max_delay_s)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Shared, change-driven view of config.json.
+
+One thread per watched file waits on inotify (through ctypes, watching the
+directory so atomic rename-into-place is seen too) and re-parses the file
+only when it was actually written. Without inotify it falls back to
+polling the file's mtime/size. Consumers read the last parsed dict with
+get(), compare `version`, register on_change() callbacks or iterate
+changes().
+"""
+import os
+import json
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+
+POLL_S = 1.0                # mtime poll interval without inotify
+RESYNC_S = 60.0             # with inotify, also stat() this often in case an event was missed
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[len]; }
+_EVENT = struct.Struct('iIII')
+
+
+def _inotify_fd(directory: str):
+    """Non-blocking inotify descriptor watching `directory`, or None when inotify is unavailable."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except Exception:
+        return None
+
+
+def _event_names(buf: bytes):
+    off = 0
+    while off + _EVENT.size <= len(buf):
+        _, _, _, n = _EVENT.unpack_from(buf, off)
+        start = off + _EVENT.size
+        yield buf[start:start + n].rstrip(b'\0')
+        off = start + n
+
+
+class ConfigWatch:
+    def __init__(self, path: str, poll_s: float = POLL_S):
+        self.path = path
+        self.poll_s = poll_s
+        self.version = 0
+        self._config = {}
+        self._sig = None
+        self._callbacks = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self.inotify = False
+        self._reload()
+
+    def get(self) -> dict:
+        """Last successfully parsed config (replaced, never mutated, on change)."""
+        return self._config
+
+    def on_change(self, fn) -> None:
+        """Call `fn(config)` from the watch thread after every change."""
+        self._callbacks.append(fn)
+
+    def wait(self, version: int, timeout: float = None) -> int:
+        """Block until the version differs from `version` (or timeout); returns the current version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def changes(self):
+        """Yield the config after each change, forever."""
+        version = self.version
+        while True:
+            version = self.wait(version)
+            yield self._config
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='config-watch', daemon=True)
+            self._thread.start()
+
+    def check(self) -> bool:
+        """Re-parse if the file's mtime/size/inode changed; returns whether the config changed."""
+        try:
+            st = os.stat(self.path)
+            sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            sig = None
+        if sig == self._sig:
+            return False
+        return self._reload()
+
+    def _reload(self) -> bool:
+        try:
+            st = os.stat(self.path)
+            self._sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                return False
+        except FileNotFoundError:
+            self._sig = None
+            return False
+        except Exception:
+            # half-written or invalid: keep serving the last good config
+            return False
+        if data == self._config:
+            return False
+        with self._cond:
+            self._config = data
+            self.version += 1
+            self._cond.notify_all()
+        for fn in list(self._callbacks):
+            try:
+                fn(data)
+            except Exception:
+                pass
+        return True
+
+    def _run(self) -> None:
+        directory, name = os.path.split(os.path.abspath(self.path))
+        name = os.fsencode(name)
+        fd = _inotify_fd(directory)
+        self.inotify = fd is not None
+        while True:
+            try:
+                if fd is None:
+                    time.sleep(self.poll_s)
+                    self.check()
+                    continue
+                ready, _, _ = select.select([fd], [], [], RESYNC_S)
+                if not ready:
+                    self.check()
+                    continue
+                hit = False
+                while True:
+                    try:
+                        buf = os.read(fd, 4096)
+                    except BlockingIOError:
+                        break
+                    if not buf:
+                        break
+                    hit = hit or name in _event_names(buf)
+                if hit:
+                    self._reload()
+            except Exception:
+                time.sleep(self.poll_s)
+
+
+_WATCHES = {}
+_LOCK = threading.Lock()
+
+
+def watch(path: str) -> ConfigWatch:
+    """The process-wide, already started watch for `path`."""
+    path = os.path.abspath(path)
+    with _LOCK:
+        w = _WATCHES.get(path)
+        if w is None:
+            w = _WATCHES[path] = ConfigWatch(path)
+            w.start()
+    return w
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Clock-drift compensation: hold the on-air input buffer at its target depth.
+
+The upstream encoder and the DAC's I2S clock never run at exactly the same
+rate, so over hours the engine's input buffer slowly fills (latency grows)
+or drains (underruns and rebuffering). A DriftController per link watches
+the buffer depth of the input on air against the latency profile's target
+and steers a ppm-level playback rate correction (applied with
+pcm_ops.Resampler) through a PI loop:
+
+    correction = (error + integral(error) / TI_S) * 1e6 / TP_S
+
+The integral converges to the actual clock offset between the two ends,
+which is exported as the link's drift in ppm. The loop is slow (minutes)
+and the correction bounded to MAX_PPM, far below an audible pitch change;
+arrival jitter is smoothed out of the depth first. Without NumPy or
+audioop to resample with, the correction is off.
+"""
+import os
+import math
+import time
+import logging
+import threading
+
+import pcm_ops
+
+MAX_PPM = float(os.environ.get('DRIFT_MAX_PPM', '300'))    # 0 disables the correction
+TP_S = float(os.environ.get('DRIFT_TP_S', '300'))          # a fill error is worked off over ~5 min
+TI_S = 4 * TP_S                 # critically damped with the buffer as the integrating plant
+SMOOTH_S = 10.0                 # depth averaging, hides decoder bursts and network jitter
+DEADBAND_S = 0.005
+MAX_DT_S = 1.0                  # longer gaps (buffering, standby) do not count
+
+
+# resampling every block in pure Python would cost a Pi Zero more than real time
+ENABLED = MAX_PPM > 0 and pcm_ops.can_resample()
+if MAX_PPM > 0 and not ENABLED:
+    logging.getLogger(__name__).warning('Drift correction disabled: needs NumPy or audioop to resample')
+
+
+def _clamp(value: float) -> float:
+    return max(-MAX_PPM, min(MAX_PPM, value))
+
+
+class DriftController:
+    """PI controller from buffer fill error to a playback rate ratio, for one link."""
+
+    def __init__(self):
+        self.drift_ppm = 0.0            # learned clock offset (source faster than the DAC: positive)
+        self.ppm = 0.0                  # correction currently applied
+        self._lock = threading.Lock()
+        self.hold()
+
+    @property
+    def enabled(self) -> bool:
+        return ENABLED
+
+    def hold(self) -> None:
+        """Pause (off air, buffering or after an underrun); the learned drift is kept."""
+        with self._lock:
+            self._error = None
+            self._t = None
+            self.ppm = self.drift_ppm
+
+    def update(self, depth_s: float, target_s: float, now: float = None) -> float:
+        """Feed the current depth; returns the ratio to resample the next block with (input/output frames)."""
+        if not self.enabled:
+            return 1.0
+        now = time.monotonic() if now is None else now
+        err = depth_s - target_s
+        with self._lock:
+            if self._t is None:
+                self._error, self._t = err, now
+                return 1.0 + self.ppm * 1e-6
+            dt = min(MAX_DT_S, max(0.0, now - self._t))
+            self._t = now
+            self._error += (err - self._error) * min(1.0, dt / SMOOTH_S)
+            e = self._error
+            e = 0.0 if abs(e) <= DEADBAND_S else e - math.copysign(DEADBAND_S, e)
+            kp = 1e6 / TP_S
+            self.drift_ppm = _clamp(self.drift_ppm + kp * e * dt / TI_S)
+            self.ppm = _clamp(kp * e + self.drift_ppm)
+            return 1.0 + self.ppm * 1e-6
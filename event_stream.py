@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Server-Sent Events fan-out: one producer polls sources, every client gets the newest values.
+
+Each subscriber keeps only the latest payload per event key, so a slow
+browser just skips intermediate frames instead of growing a queue, and a
+per-client minimum interval caps how often it is written to.
+"""
+import json
+import time
+import threading
+
+TICK_S = 0.1
+HEARTBEAT_S = 15.0
+MAX_CLIENTS = 16
+
+
+class Subscriber:
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def offer(self, key, event: str, data) -> None:
+        with self._cond:
+            self._pending[key] = (event, data)
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def drain(self, timeout: float):
+        """Wait up to `timeout` for pending events; returns a list or None once closed."""
+        with self._cond:
+            if not self._pending and not self._closed:
+                self._cond.wait(timeout)
+            if self._closed:
+                return None
+            items = list(self._pending.values())
+            self._pending.clear()
+        return items
+
+
+class _Source:
+    def __init__(self, name, fn, every, on_change):
+        self.name = name
+        self.fn = fn
+        self.every = every
+        self.on_change = on_change
+        self.next_due = 0.0
+        self.last = None
+
+
+class EventHub:
+    def __init__(self):
+        self._sources = []
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._producer = None
+        self._last_sent = {}
+
+    def add_source(self, name: str, fn, every: float, on_change: bool = False) -> None:
+        """Register `fn()` to be sampled every `every` seconds while clients are connected.
+
+        With on_change=True a value is only pushed when it differs from the
+        previous one. Sources must not block: they all share one producer thread.
+        """
+        self._sources.append(_Source(name, fn, every, on_change))
+
+    def publish(self, event: str, data, key=None) -> None:
+        with self._lock:
+            self._last_sent[key or event] = (event, data)
+            subs = list(self._subs)
+        for sub in subs:
+            sub.offer(key or event, event, data)
+
+    def forget(self, key) -> None:
+        """Stop replaying `key` to new clients (e.g. a job that was evicted)."""
+        with self._lock:
+            self._last_sent.pop(key, None)
+
+    def subscribe(self, min_interval: float = 0.25):
+        with self._lock:
+            if len(self._subs) >= MAX_CLIENTS:
+                return None
+            sub = Subscriber(min_interval)
+            self._subs.add(sub)
+            snapshot = list(self._last_sent.items())
+            if self._producer is None or not self._producer.is_alive():
+                self._producer = threading.Thread(target=self._produce, name='event-hub', daemon=True)
+                self._producer.start()
+        # new clients start from the current state rather than waiting for a change
+        for key, (event, data) in snapshot:
+            sub.offer(key, event, data)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        sub.close()
+        with self._lock:
+            self._subs.discard(sub)
+
+    def clients(self) -> int:
+        with self._lock:
+            return len(self._subs)
+
+    def _sample(self, src: _Source) -> None:
+        try:
+            value = src.fn()
+        except Exception:
+            return
+        if src.on_change and value == src.last:
+            return
+        src.last = value
+        self.publish(src.name, value)
+
+    def _produce(self) -> None:
+        while True:
+            with self._lock:
+                if not self._subs:
+                    self._producer = None
+                    return
+            now = time.monotonic()
+            for src in self._sources:
+                if now >= src.next_due:
+                    src.next_due = now + src.every
+                    self._sample(src)
+            time.sleep(TICK_S)
+
+    def stream(self, sub: Subscriber):
+        """Generator of SSE-formatted chunks for one subscriber; unsubscribes on exit."""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                items = sub.drain(HEARTBEAT_S)
+                if items is None:
+                    return
+                if not items:
+                    yield ': ping\n\n'
+                    continue
+                yield ''.join(f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+                              for event, data in items)
+                # rate limit: anything published meanwhile is coalesced into the next write
+                time.sleep(sub.min_interval)
+        finally:
+            self.unsubscribe(sub)
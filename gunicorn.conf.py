@@ -0,0 +1,38 @@
+"""Production serving: `gunicorn -c gunicorn.conf.py web:app`.
+
+The gunicorn master starts playback_daemon.py once (and restarts it if it
+exits); the web workers are stateless and scale on their own. Set
+DECODER_DAEMON=external when the daemon runs as a separate service.
+"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+bind = os.environ.get('DECODER_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('DECODER_WORKERS', '2'))
+# SSE clients hold a thread each; gthread heartbeats don't depend on request length
+worker_class = 'gthread'
+threads = int(os.environ.get('DECODER_THREADS', '16'))
+timeout = 60
+graceful_timeout = 10
+
+_STOP = threading.Event()
+_KEEPER = None
+
+
+def on_starting(server):
+    global _KEEPER
+    if os.environ.get('DECODER_DAEMON', 'managed') == 'external':
+        return
+    import playback_daemon
+    _KEEPER = playback_daemon.keep_running(_STOP)
+    if not playback_daemon.wait_ready():
+        server.log.warning('playback daemon not ready at %s', playback_daemon.SOCKET_PATH)
+
+
+def on_exit(server):
+    _STOP.set()
+    if _KEEPER is not None:
+        _KEEPER.join(timeout=10)
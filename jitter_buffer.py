@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Latency profiles and arrival-jitter estimation for the engine's input buffers.
+
+A profile fixes how much decoded audio the output stage holds before it
+plays (and again after running dry), how much an input may accumulate,
+and the ALSA buffer/period sizes of the sink. The adaptive profile sizes
+the target per link from JitterEstimator: the longest time the decoder
+has recently fallen behind real time, which is exactly the headroom a
+buffer needs so that it never runs dry. Its sink sizes follow the same
+measurement (see `sink_sizes`), in the proportion the fixed profiles use.
+"""
+import time
+import threading
+from collections import deque, namedtuple
+
+# target_s: depth to reach before playing (None: measured), max_s: input buffer cap,
+# sink_*_ms: ALSA buffer/period of the output device (and the aplay pipe size); None: from the target
+LatencyProfile = namedtuple('LatencyProfile', 'name target_s max_s sink_buffer_ms sink_period_ms')
+
+LOW_LATENCY = 'low-latency'
+BALANCED = 'balanced'
+ROBUST = 'robust'
+ADAPTIVE = 'adaptive'
+
+PROFILES = {
+    LOW_LATENCY: LatencyProfile(LOW_LATENCY, 0.15, 0.6, 60, 15),
+    BALANCED: LatencyProfile(BALANCED, 0.5, 2.0, 200, 50),
+    ROBUST: LatencyProfile(ROBUST, 2.0, 4.0, 500, 125),
+    ADAPTIVE: LatencyProfile(ADAPTIVE, None, 4.0, None, None),
+}
+DEFAULT_PROFILE = BALANCED
+
+WINDOW_S = 30.0             # jitter history considered by the adaptive profile
+ADAPTIVE_MIN_S = 0.1
+ADAPTIVE_MAX_S = 3.0
+MARGIN = 1.5                # headroom over the worst lateness seen
+FLOOR_S = 0.05
+RECOMPUTE_S = 0.5           # jitter() rescans the window at most this often
+SINK_SHARE = 0.4            # sink buffer per second of target depth (the fixed profiles' ratio)
+SINK_MIN_MS = 60
+SINK_MAX_MS = 500
+SINK_PERIODS = 4
+
+
+def get_profile(name: str) -> LatencyProfile:
+    return PROFILES.get(name) or PROFILES[DEFAULT_PROFILE]
+
+
+def sink_sizes(profile: LatencyProfile, target_s: float):
+    """(buffer_ms, period_ms) to open the sink with: the profile's own, or derived from `target_s`."""
+    if profile.sink_buffer_ms is not None:
+        return profile.sink_buffer_ms, profile.sink_period_ms
+    buffer_ms = int(min(SINK_MAX_MS, max(SINK_MIN_MS, target_s * 1000 * SINK_SHARE)))
+    return buffer_ms, buffer_ms // SINK_PERIODS
+
+
+class JitterEstimator:
+    """Tracks how far PCM arrival lags behind real time for one decoder."""
+
+    def __init__(self, bytes_per_s: int, window_s: float = WINDOW_S):
+        self.bytes_per_s = bytes_per_s
+        self.window_s = window_s
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Start over (a new decoder process has its own timeline)."""
+        with self._lock:
+            self._t0 = None
+            self._total = 0
+            self._offsets = deque()     # (t, arrival time minus media time)
+            self._cached = (None, 0.0)  # (when, jitter) of the last scan
+
+    def feed(self, nbytes: int, now: float = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._t0 is None:
+                self._t0 = now
+            self._total += nbytes
+            self._offsets.append((now, now - self._t0 - self._total / self.bytes_per_s))
+            while now - self._offsets[0][0] > self.window_s:
+                self._offsets.popleft()
+
+    def jitter(self) -> float:
+        """Largest rise of the arrival offset above its running minimum in the window, in seconds.
+
+        Bursts (data ahead of real time) lower the offset and cost nothing;
+        only falling behind after having been ahead has to be covered. The
+        scan is O(window), so its result is reused for RECOMPUTE_S: the
+        output stage asks once per block.
+        """
+        now = time.monotonic()
+        with self._lock:
+            when, worst = self._cached
+            if when is not None and now - when < RECOMPUTE_S:
+                return worst
+            offsets = [d for _, d in self._offsets]
+        worst = 0.0
+        low = None
+        for d in offsets:
+            low = d if low is None or d < low else low
+            worst = max(worst, d - low)
+        with self._lock:
+            self._cached = (now, worst)
+        return worst
+
+    def target(self, lo: float = ADAPTIVE_MIN_S, hi: float = ADAPTIVE_MAX_S) -> float:
+        return min(hi, max(lo, self.jitter() * MARGIN + FLOOR_S))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Serialized playback command queue.
+
+Long player operations (start, toggle, switch, dual start, failover) are
+submitted as jobs and executed one at a time on a single worker thread,
+so request handlers return immediately with a job id and two commands can
+never interleave on the engine. Job state changes are reported through an
+`on_update(job)` callback (the app pushes them over SSE).
+"""
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+
+KEEP_JOBS = 50
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    def __init__(self, kind: str, fn, args, kwargs):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+        self._call = (fn, args, kwargs)
+
+    def as_dict(self) -> dict:
+        return {'id': self.id, 'kind': self.kind, 'state': self.state,
+                'result': self.result, 'error': self.error, 'created': self.created,
+                'started': self.started, 'finished': self.finished}
+
+
+class JobQueue:
+    def __init__(self, on_update=None, on_evict=None, keep: int = KEEP_JOBS):
+        self.on_update = on_update
+        self.on_evict = on_evict
+        self.keep = keep
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def submit(self, kind: str, fn, *args, **kwargs) -> Job:
+        """Queue `fn(*args, **kwargs)`; its return value becomes the job result."""
+        job = Job(kind, fn, args, kwargs)
+        evicted = []
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                old = next(iter(self._jobs.values()))
+                if old.state not in FINISHED:
+                    break
+                evicted.append(self._jobs.pop(old.id))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='playback-jobs', daemon=True)
+                self._worker.start()
+        for old in evicted:
+            self._notify(self.on_evict, old)
+        self._notify(self.on_update, job)
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        with self._lock:
+            return [j for j in self._jobs.values() if j.state not in FINISHED]
+
+    def cancel_pending(self) -> int:
+        """Cancel jobs that have not started yet (e.g. on stop); returns how many."""
+        with self._lock:
+            cancelled = [j for j in self._jobs.values() if j.state == QUEUED]
+            for job in cancelled:
+                job.state = CANCELLED
+        for job in cancelled:
+            self._finish(job, CANCELLED, error='cancelled')
+        return len(cancelled)
+
+    def _notify(self, fn, job: Job) -> None:
+        if fn is not None:
+            try:
+                fn(job)
+            except Exception:
+                pass
+
+    def _finish(self, job: Job, state: str, result=None, error=None) -> None:
+        job.state = state
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        job.done.set()
+        self._notify(self.on_update, job)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.state != QUEUED:
+                    continue
+                job.state = RUNNING
+                job.started = time.time()
+            self._notify(self.on_update, job)
+            fn, args, kwargs = job._call
+            try:
+                self._finish(job, DONE, result=fn(*args, **kwargs))
+            except Exception as e:
+                self._finish(job, FAILED, error=str(e))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Shared-memory level bus: one writer publishes meter frames, any process reads them.
+
+The bus is a small fixed-layout file in /dev/shm mapped with mmap:
+
+    header  <4sIIQ   magic, layout version, slot count, frames published
+    slot    <I4xd4f  seqlock counter, wall time, L_db, R_db, L_peak_db, R_peak_db
+
+Each slot is guarded by a seqlock: the writer makes the counter odd, writes
+the payload and makes it even again, and a reader retries until it sees the
+same even counter before and after copying the payload. Frames go round a
+small ring so a reader is never racing the slot currently being written.
+"""
+import os
+import mmap
+import time
+import struct
+import tempfile
+
+MAGIC = b'LVB1'
+VERSION = 1
+SLOTS = 8
+
+HEADER = struct.Struct('<4sIIQ')
+SEQ = struct.Struct('<I')
+PAYLOAD = struct.Struct('<d4f')
+SLOT_SIZE = 32
+HEAD_OFFSET = 12
+SIZE = HEADER.size + SLOTS * SLOT_SIZE
+
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+DEFAULT_PATH = os.environ.get('LEVEL_BUS_PATH', os.path.join(_SHM_DIR, 'decoder-levels'))
+
+
+class LevelBus:
+    """Writer (`create`) or reader (`attach`) side of the level bus."""
+
+    def __init__(self, path: str, mm: mmap.mmap, fd: int):
+        self.path = path
+        self._mm = mm
+        self._fd = fd
+
+    @classmethod
+    def create(cls, path: str = DEFAULT_PATH) -> 'LevelBus':
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != SIZE:
+                os.ftruncate(fd, SIZE)
+            mm = mmap.mmap(fd, SIZE)
+        except Exception:
+            os.close(fd)
+            raise
+        magic, version, slots, _ = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION or slots != SLOTS:
+            mm[:] = bytes(SIZE)
+            HEADER.pack_into(mm, 0, MAGIC, VERSION, SLOTS, 0)
+        return cls(path, mm, fd)
+
+    @classmethod
+    def attach(cls, path: str = DEFAULT_PATH) -> 'LevelBus':
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            mm = mmap.mmap(fd, SIZE, access=mmap.ACCESS_READ)
+        except Exception:
+            os.close(fd)
+            raise
+        magic, version, slots, _ = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION or slots != SLOTS:
+            mm.close()
+            os.close(fd)
+            raise ValueError(f'{path} is not a level bus')
+        return cls(path, mm, fd)
+
+    def close(self) -> None:
+        try:
+            self._mm.close()
+        finally:
+            os.close(self._fd)
+
+    def publish(self, db_l: float, db_r: float, pk_l: float, pk_r: float, t: float = None) -> None:
+        mm = self._mm
+        head = struct.unpack_from('<Q', mm, HEAD_OFFSET)[0]
+        off = HEADER.size + (head % SLOTS) * SLOT_SIZE
+        seq = SEQ.unpack_from(mm, off)[0]
+        SEQ.pack_into(mm, off, (seq + 1) & 0xFFFFFFFF)
+        PAYLOAD.pack_into(mm, off + 8, time.time() if t is None else t, db_l, db_r, pk_l, pk_r)
+        SEQ.pack_into(mm, off, (seq + 2) & 0xFFFFFFFF)
+        struct.pack_into('<Q', mm, HEAD_OFFSET, head + 1)
+
+    def read(self, retries: int = 16):
+        """Return the newest frame as a dict (same keys as levels.json), or None."""
+        mm = self._mm
+        for _ in range(retries):
+            head = struct.unpack_from('<Q', mm, HEAD_OFFSET)[0]
+            if head == 0:
+                return None
+            off = HEADER.size + ((head - 1) % SLOTS) * SLOT_SIZE
+            s1 = SEQ.unpack_from(mm, off)[0]
+            if s1 & 1:
+                continue
+            t, db_l, db_r, pk_l, pk_r = PAYLOAD.unpack_from(mm, off + 8)
+            if SEQ.unpack_from(mm, off)[0] != s1:
+                continue
+            return {'t': t, 'L_db': round(db_l, 1), 'R_db': round(db_r, 1),
+                    'L_peak_db': round(pk_l, 1), 'R_peak_db': round(pk_r, 1)}
+        return None
+
+
+class LevelReader:
+    """Lazily attaches to the bus so readers can start before the writer."""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._bus = None
+        self._ino = None
+
+    def read(self):
+        if self._bus is None:
+            try:
+                self._bus = LevelBus.attach(self.path)
+                self._ino = os.fstat(self._bus._fd).st_ino
+            except Exception:
+                return None
+        try:
+            frame = self._bus.read()
+        except Exception:
+            frame = None
+        if frame is None or time.time() - frame['t'] > 2.0:
+            # writer may have recreated the file; re-attach on the next call
+            try:
+                if os.stat(self.path).st_ino != self._ino:
+                    self._bus.close()
+                    self._bus = None
+            except Exception:
+                pass
+        return frame
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Bulk RMS/peak/clip metering of interleaved s16 PCM.
+
+Uses NumPy when it is installed and falls back to strided `array` slices
+(with `audioop` for the sum of squares where available) otherwise.
+"""
+import math
+import array
+import operator
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import audioop
+except ImportError:  # pragma: no cover
+    audioop = None
+
+FULL_SCALE = 32767.0
+CLIP_LEVEL = 32767
+
+# rms: per-channel RMS normalised to 0..1, peak: per-channel max |sample|,
+# clips: per-channel count of samples at or beyond full scale, frames: frames measured
+Levels = namedtuple('Levels', 'rms peak clips frames')
+
+
+def to_dbfs(value: float) -> float:
+    """Convert a 0..1 linear level to dBFS, floored at -120 dB and rounded to 0.1."""
+    return round(20*math.log10(max(1e-6, value)), 1)
+
+
+def _measure_numpy(data: bytes, channels: int) -> Levels:
+    frames = len(data) // (2*channels)
+    if frames == 0:
+        return Levels((0.0,)*channels, (0,)*channels, (0,)*channels, 0)
+    pcm = np.frombuffer(data, dtype='<i2', count=frames*channels).reshape(frames, channels)
+    wide = pcm.astype(np.int32)
+    rms = np.sqrt(np.einsum('ij,ij->j', wide, wide, dtype=np.float64) / frames) / FULL_SCALE
+    mag = np.abs(wide)
+    peak = mag.max(axis=0)
+    clips = np.count_nonzero(mag >= CLIP_LEVEL, axis=0)
+    return Levels(tuple(rms.tolist()), tuple(peak.tolist()), tuple(clips.tolist()), frames)
+
+
+def _measure_array(data: bytes, channels: int) -> Levels:
+    frames = len(data) // (2*channels)
+    if frames == 0:
+        return Levels((0.0,)*channels, (0,)*channels, (0,)*channels, 0)
+    samples = array.array('h')
+    samples.frombytes(data[:frames*channels*2])
+    rms = []
+    peak = []
+    clips = []
+    for c in range(channels):
+        ch = samples[c::channels] if channels > 1 else samples
+        if audioop is not None:
+            frag = ch.tobytes()
+            rms.append(audioop.rms(frag, 2) / FULL_SCALE)
+            peak.append(audioop.max(frag, 2))
+        else:
+            rms.append(math.sqrt(sum(map(operator.mul, ch, ch)) / frames) / FULL_SCALE)
+            peak.append(max(max(ch), -min(ch)))
+        # counting is a full scan, so only do it when the peak says there is something to count
+        # abs(s) >= CLIP_LEVEL, as on the NumPy path: 32767, -32767 and -32768
+        clips.append(ch.count(32767) + ch.count(-32767) + ch.count(-32768) if peak[-1] >= CLIP_LEVEL else 0)
+    return Levels(tuple(rms), tuple(peak), tuple(clips), frames)
+
+
+def measure(data: bytes, channels: int = 2) -> Levels:
+    """Meter a block of interleaved little-endian s16 PCM; trailing partial frames are ignored."""
+    if np is not None:
+        return _measure_numpy(data, channels)
+    return _measure_array(data, channels)
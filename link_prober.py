@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Background link health prober with a TTL cache.
+
+One thread probes every configured link concurrently on a fixed interval
+and caches the outcome, so request handlers and the failover monitor read
+the cache instead of opening their own upstream connections.
+"""
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+
+import metrics
+
+PROBE_INTERVAL_S = 3.0
+PROBE_TIMEOUT_S = 2.0
+TTL_S = 10.0
+READ_BYTES = 512
+
+PROBE_SECONDS = metrics.REGISTRY.histogram(
+    'link_probe_seconds', 'Health probe latency (request sent to response headers) per link.', ('link',))
+PROBE_FAILURES = metrics.REGISTRY.counter(
+    'link_probe_failures_total', 'Health probes that failed, per link.', ('link',))
+
+# latency_ms: request sent to response headers, ttfb_ms: request sent to first body bytes;
+# source: 'probe', or 'relay' when read off a stream_relay connection (latency_ms is then the age of its last data)
+ProbeResult = namedtuple('ProbeResult', 'url ok status latency_ms ttfb_ms error checked_at source',
+                         defaults=('probe',))
+
+
+def probe(url: str, timeout: float = PROBE_TIMEOUT_S) -> ProbeResult:
+    t0 = time.monotonic()
+    status = None
+    latency = None
+    try:
+        req = Request(url, headers={'User-Agent':'Mozilla/5.0'})
+        with urlopen(req, timeout=timeout) as r:
+            status = getattr(r, 'status', None)
+            latency = (time.monotonic() - t0) * 1000.0
+            data = r.read(READ_BYTES)
+        ttfb = (time.monotonic() - t0) * 1000.0
+        ok = bool(data)
+        return ProbeResult(url, ok, status, round(latency, 1), round(ttfb, 1),
+                           None if ok else 'empty body', time.monotonic())
+    except HTTPError as e:
+        return ProbeResult(url, False, e.code, round((time.monotonic() - t0) * 1000.0, 1), None,
+                           str(e), time.monotonic())
+    except Exception as e:
+        return ProbeResult(url, False, status, latency and round(latency, 1), None, str(e), time.monotonic())
+
+
+class LinkProber:
+    def __init__(self, urls_fn, interval: float = PROBE_INTERVAL_S, ttl: float = TTL_S,
+                 timeout: float = PROBE_TIMEOUT_S, probe_fn=probe):
+        """`urls_fn()` returns the links to probe each round (empty strings are skipped);
+        `probe_fn(url, timeout)` returns a ProbeResult (default: a short HTTP GET)."""
+        self.urls_fn = urls_fn
+        self.probe_fn = probe_fn
+        self.interval = interval
+        self.ttl = ttl
+        self.timeout = timeout
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='probe')
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name='link-prober', daemon=True)
+            self._thread.start()
+
+    def refresh(self) -> None:
+        """Probe now instead of at the next interval (e.g. after the links changed)."""
+        self._wake.set()
+
+    def result(self, url: str):
+        """Cached ProbeResult for `url`, or None if never probed or older than the TTL."""
+        with self._lock:
+            res = self._cache.get(url)
+        if res is None or time.monotonic() - res.checked_at > self.ttl:
+            return None
+        return res
+
+    def healthy(self, url: str) -> bool:
+        res = self.result(url) if url else None
+        return bool(res and res.ok)
+
+    def probe_round(self) -> None:
+        configured = list(self.urls_fn())
+        urls = [u for u in dict.fromkeys(configured) if u]
+        results = list(self._pool.map(lambda u: self.probe_fn(u, self.timeout), urls))
+        for res in results:
+            # labelled by link number, not URL: bounded cardinality, no stream addresses in /metrics
+            link = f'l{configured.index(res.url) + 1}'
+            if res.latency_ms is not None and res.source == 'probe':
+                PROBE_SECONDS.observe(res.latency_ms / 1000.0, link=link)
+            if not res.ok:
+                PROBE_FAILURES.inc(link=link)
+        with self._lock:
+            for res in results:
+                self._cache[res.url] = res
+            for url in list(self._cache):
+                if url not in urls:
+                    del self._cache[url]
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.probe_round()
+            except Exception:
+                pass
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Long-lived level metering workers, one decoder per configured link.
+
+Readings keep the /api/levels shape: `L_db`/`R_db` are peak levels (as
+they always were); the smoothed RMS is added as `L_rms_db`/`R_rms_db`,
+with `age` the seconds since the last update (None when stale).
+"""
+import os
+import time
+import shutil
+import itertools
+import subprocess
+import threading
+
+import level_meter
+from level_meter import FULL_SCALE, to_dbfs
+from supervisor import SUPERVISOR, terminate
+
+FFMPEG = shutil.which('ffmpeg') or '/usr/bin/ffmpeg'
+
+SAMPLE_RATE = 16000      # Hz (low CPU)
+CHUNK_MS    = 50         # update ~20 Hz
+CHUNK_FR    = SAMPLE_RATE * CHUNK_MS // 1000  # frames per update
+ALPHA       = 0.6        # smoothing factor (higher = snappier)
+STALE_S     = 1.0        # levels older than this read as silence
+
+IDLE_TIMEOUT_S = float(os.environ.get('METER_IDLE_TIMEOUT_S', '30'))
+
+_SERIAL = itertools.count(1)
+
+
+class MeterWorker:
+    """Keeps one ffmpeg decoding `url` and a rolling RMS/peak state."""
+
+    def __init__(self, url: str, resolve=None):
+        self.url = url
+        self.resolve = resolve
+        # unique per worker: retiring an old worker must not forget() its replacement's ffmpeg
+        self.name = f'meter:{url}#{next(_SERIAL)}'
+        self.last_access = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._proc = None
+        self._rms = [1e-6, 1e-6]
+        self._peak = [0, 0]
+        self._updated = 0.0
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        terminate(self._proc, 0)
+
+    def retire(self) -> None:
+        """Stop for good and drop the supervisor's entry for this worker's ffmpeg."""
+        self.stop()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        SUPERVISOR.forget(self.name)
+
+    def alive(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def touch(self) -> None:
+        self.last_access = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            rms = list(self._rms)
+            peak = list(self._peak)
+            updated = self._updated
+        if time.monotonic() - updated > STALE_S:
+            return {'L_db': -60.0, 'R_db': -60.0, 'L_rms_db': -60.0, 'R_rms_db': -60.0, 'age': None}
+        return {
+            'L_db': to_dbfs(peak[0]/FULL_SCALE), 'R_db': to_dbfs(peak[1]/FULL_SCALE),
+            'L_rms_db': to_dbfs(rms[0]), 'R_rms_db': to_dbfs(rms[1]),
+            'age': round(time.monotonic() - updated, 3),
+        }
+
+    def _update(self, data: bytes) -> None:
+        lv = level_meter.measure(data, 2)
+        if lv.frames == 0:
+            return
+        inst_l = max(1e-6, lv.rms[0])
+        inst_r = max(1e-6, lv.rms[1])
+        with self._lock:
+            self._rms[0] = (1-ALPHA)*self._rms[0] + ALPHA*inst_l
+            self._rms[1] = (1-ALPHA)*self._rms[1] + ALPHA*inst_r
+            self._peak = list(lv.peak)
+            self._updated = time.monotonic()
+
+    def _run(self) -> None:
+        bytes_per_chunk = CHUNK_FR * 2 * 2
+        while not self._stop.is_set():
+            try:
+                self._proc = SUPERVISOR.spawn(self.name, [
+                    FFMPEG,
+                    '-hide_banner','-loglevel','error','-nostdin',
+                    '-reconnect','1','-reconnect_streamed','1','-reconnect_delay_max','10',
+                    '-vn','-sn','-dn','-i', self.resolve(self.url) if self.resolve else self.url,
+                    '-f','s16le','-ac','2','-ar',str(SAMPLE_RATE), '-'
+                ], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            except Exception:
+                self._stop.wait(SUPERVISOR.backoff(self.name))
+                continue
+            try:
+                while not self._stop.is_set():
+                    data = self._proc.stdout.read(bytes_per_chunk)
+                    if not data:
+                        break
+                    self._update(data)
+            except Exception:
+                pass
+            finally:
+                terminate(self._proc)
+            self._stop.wait(SUPERVISOR.backoff(self.name))
+
+
+class MeterService:
+    """Starts workers on demand and reaps them after `idle_timeout` seconds unused."""
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT_S, resolve=None):
+        """`resolve(url)` gives the address the meter's ffmpeg opens (e.g. the local relay)."""
+        self.idle_timeout = idle_timeout
+        self.resolve = resolve
+        self._workers = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def levels(self, url: str) -> dict:
+        with self._lock:
+            worker = self._workers.get(url)
+            if worker is None or not worker.alive():
+                worker = MeterWorker(url, self.resolve)
+                worker.start()
+                self._workers[url] = worker
+            worker.touch()
+            self._ensure_reaper()
+        return worker.snapshot()
+
+    def retain(self, urls) -> None:
+        """Stop workers for URLs that are no longer configured."""
+        keep = set(u for u in urls if u)
+        with self._lock:
+            retired = [self._workers.pop(url) for url in list(self._workers) if url not in keep]
+        # joined outside the lock: levels() callers must not wait on a dying ffmpeg
+        for worker in retired:
+            worker.retire()
+
+    def stop_all(self) -> None:
+        with self._lock:
+            retired = list(self._workers.values())
+            self._workers.clear()
+        for worker in retired:
+            worker.retire()
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, name='meter-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 4))
+            now = time.monotonic()
+            with self._lock:
+                retired = [self._workers.pop(url) for url, worker in list(self._workers.items())
+                           if now - worker.last_access > self.idle_timeout or not worker.alive()]
+                done = not self._workers
+                if done:
+                    self._reaper = None
+            for worker in retired:
+                worker.retire()
+            if done:
+                return
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Minimal Prometheus metrics (text exposition format 0.0.4), no client library needed.
+
+Counters, gauges and histograms are registered once at import in the
+module that owns them and updated in place; recording is a dict lookup
+and an add under a per-metric lock, so it is cheap enough for the audio
+paths. `render()` produces the /metrics body.
+"""
+import bisect
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STARTUP_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _num(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_labels(self.labelnames, key)} {_num(value)}' for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labels=(), fn=None):
+        """With `fn`, the gauge is sampled at scrape time: `fn()` returns a value, or a {labels tuple: value} dict."""
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception:
+                return []
+            values = value if isinstance(value, dict) else {(): value}
+            with self._lock:
+                self._values = {tuple(str(v) for v in k): v for k, v in values.items() if v is not None}
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (last one is +Inf), sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = _labels(self.labelnames, key, (f'le="{_num(float(bound))}"',))
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            base = _labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{base} {_num(round(total, 6))}')
+            lines.append(f'{self.name}_count{base} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self, prefix: str = 'decoder_'):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, cls, name, *args, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._add(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels=(), fn=None) -> Gauge:
+        return self._add(Gauge, name, help, labels, fn=fn)
+
+    def histogram(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            if samples:
+                lines += metric.header() + samples
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+REGISTRY = Registry()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Incremental renderer for the status OLED.
+
+Frames are drawn into an off-screen image and compared page by page (an
+8-pixel-high stripe, the unit the controller's RAM is addressed in) with
+the last frame sent. Only the changed column span of each changed page is
+written over I2C, glyphs are rendered once and pasted from a cache, and
+the frame rate drops whenever the bytes sent would exceed the bus budget.
+
+Partial page writes are used on the SSD1306/SSD1309 (horizontal
+addressing) and SH1106 (page addressing); other controllers get a full
+device.display() but only when the frame actually changed.
+"""
+import os
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+BUDGET_BPS = int(os.environ.get('OLED_BUDGET_BPS', '4000'))   # ~1/3 of a 100 kHz I2C bus
+MAX_FPS = float(os.environ.get('OLED_MAX_FPS', '16'))
+STATS_EVERY_S = float(os.environ.get('OLED_STATS_S', '0'))      # >0: log throughput to stderr
+
+SH1106_COLUMN_OFFSET = 2          # 128-pixel panel centred in the SH1106's 132-column RAM
+_ROTATE_270 = getattr(Image, 'Transpose', Image).ROTATE_270
+
+PAGED = ('ssd1306', 'ssd1309')
+PAGED_SH = ('sh1106',)
+
+
+class GlyphCache:
+    """Per-character bitmaps for a PIL font, rendered once."""
+
+    def __init__(self, font, mode: str = '1'):
+        self.font = font
+        self.mode = mode
+        self._glyphs = {}
+
+    def glyph(self, ch: str):
+        g = self._glyphs.get(ch)
+        if g is None:
+            if hasattr(self.font, 'getlength'):
+                advance = int(round(self.font.getlength(ch)))
+            else:
+                advance = self.font.getsize(ch)[0]
+            height = self.font.getbbox('Ag')[3] if hasattr(self.font, 'getbbox') else self.font.getsize('Ag')[1]
+            img = Image.new(self.mode, (max(1, advance), max(1, height)), 0)
+            ImageDraw.Draw(img).text((0, 0), ch, fill=255, font=self.font)
+            g = self._glyphs[ch] = (img, advance)
+        return g
+
+    def draw(self, frame, xy, text: str) -> int:
+        """Paste `text` at `xy`; returns the x after the last glyph."""
+        x, y = xy
+        for ch in text:
+            img, advance = self.glyph(ch)
+            frame.paste(img, (x, y))
+            x += advance
+        return x
+
+
+class OledRenderer:
+    def __init__(self, device, font=None, budget_bps: int = BUDGET_BPS, max_fps: float = MAX_FPS):
+        self.device = device
+        self.budget_bps = budget_bps
+        self.min_interval = 1.0 / max_fps
+        self.glyphs = GlyphCache(font, device.mode) if font is not None else None
+        kind = type(device).__name__
+        self._paged = device.mode == '1' and (kind in PAGED or kind in PAGED_SH)
+        self._page_addressing = kind in PAGED_SH
+        self._last = None           # last frame sent: list of page bytes, or the image when not paged
+        self._frame_t = time.monotonic()
+        self._sent_at = []          # (monotonic, bytes) over the last second
+        self.bytes_sent = 0         # total since start
+        self.frames_sent = 0
+        self._stats_t = time.monotonic()
+
+    # -- drawing ---------------------------------------------------------
+
+    def frame(self):
+        """(image, draw) for a blank frame in the device's logical orientation."""
+        img = Image.new(self.device.mode, self.device.size, 0)
+        return img, ImageDraw.Draw(img)
+
+    def text(self, frame, draw, xy, text: str) -> None:
+        if self.glyphs is not None:
+            self.glyphs.draw(frame, xy, text)
+        else:
+            draw.text(xy, text, fill=255)
+
+    # -- transmission ----------------------------------------------------
+
+    def show(self, frame) -> int:
+        """Send what changed since the last frame; returns the bytes written to the bus."""
+        if not self._paged:
+            if self._last is not None and frame.tobytes() == self._last:
+                return self._account(0)
+            self.device.display(frame)
+            self._last = frame.tobytes()
+            w, h = self.device.size
+            return self._account(w * h // 8)
+        phys = self.device.preprocess(frame)
+        width, height = phys.size
+        pages = [phys.crop((0, p*8, width, p*8 + 8)).transpose(_ROTATE_270).tobytes()
+                 for p in range(height // 8)]
+        sent = 0
+        for p, buf in enumerate(pages):
+            old = self._last[p] if self._last is not None else None
+            if buf == old:
+                continue
+            c0, c1 = 0, width - 1
+            if old is not None:
+                while buf[c0] == old[c0]:
+                    c0 += 1
+                while buf[c1] == old[c1]:
+                    c1 -= 1
+            sent += self._write_page(p, c0, c1, buf[c0:c1 + 1])
+        self._last = pages
+        return self._account(sent)
+
+    def _write_page(self, page: int, c0: int, c1: int, data: bytes) -> int:
+        dev = self.device
+        if self._page_addressing:
+            col = c0 + SH1106_COLUMN_OFFSET
+            cmd = (0xB0 + page, col & 0x0F, 0x10 | (col >> 4))
+        else:
+            colstart = getattr(dev, '_colstart', 0)
+            cmd = (0x21, colstart + c0, colstart + c1, 0x22, page, page)
+        dev.command(*cmd)
+        dev.data(list(data))
+        return len(cmd) + len(data)
+
+    def _account(self, nbytes: int) -> int:
+        now = time.monotonic()
+        if nbytes:
+            self.bytes_sent += nbytes
+            self.frames_sent += 1
+            self._sent_at.append((now, nbytes))
+        while self._sent_at and now - self._sent_at[0][0] > 1.0:
+            self._sent_at.pop(0)
+        if STATS_EVERY_S > 0 and now - self._stats_t >= STATS_EVERY_S:
+            self._stats_t = now
+            sys.stderr.write(f'oled: {self.bytes_per_s} B/s, {self.frames_sent} frames, {self.bytes_sent} B total\n')
+        return nbytes
+
+    @property
+    def bytes_per_s(self) -> int:
+        return sum(n for _, n in self._sent_at)
+
+    # -- pacing ----------------------------------------------------------
+
+    def pace(self, last_sent: int) -> None:
+        """Sleep until the next frame: at most MAX_FPS, and slow enough to keep `last_sent` within budget."""
+        interval = max(self.min_interval, last_sent / float(self.budget_bps) if self.budget_bps > 0 else 0.0)
+        delay = self._frame_t + interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._frame_t = time.monotonic()
@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
-import time, socket, subprocess, os, sys, json
+import time, socket, subprocess, os, sys, json, select, threading
+import config_watch
+import level_bus
+import oled_render
 from PIL import ImageFont
 from luma.core.interface.serial import i2c
 from luma.core.render import canvas
@@ -15,14 +18,12 @@ ROTATE = int(os.environ.get('OLED_ROTATE','3'))  # 3 = 270° portrait
 BASE = os.path.dirname(os.path.abspath(__file__))
 LEVELS_PATH = os.path.join(BASE, 'levels.json')
 CONF_PATH = os.path.join(BASE, 'config.json')
+LEVELS = level_bus.LevelReader()
+IP_REFRESH_S = 30.0       # re-resolve the IP at least this often (netlink events trigger it sooner)
 
-def load_playing() -> bool:
-    try:
-        with open(CONF_PATH,'r',encoding='utf-8') as f:
-            j=json.load(f)
-        return bool(j.get('is_playing', False))
-    except Exception:
-        return False
+# rtnetlink multicast groups: link up/down and IPv4 address changes
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
 
 
 
@@ -47,15 +48,64 @@ def get_ip() -> str:
 
 
 
-def get_status() -> str:
-    try:
-        with open(CONF_PATH,'r',encoding='utf-8') as f:
-            j = json.load(f)
-        if j.get('is_playing', False):
-            return 'Playing'
-    except Exception:
-        pass
-    return 'Stopped'
+class StatusModel:
+    """Slow-changing display inputs, decoded once per change instead of once per frame.
+
+    The IP is re-resolved on rtnetlink address/link events (or every
+    IP_REFRESH_S without them) on a background thread; config.json is
+    parsed by config_watch only when it is written.
+    """
+
+    def __init__(self):
+        self.ip = '0.0.0.0'
+        self.playing = False
+        self._config = None
+        self._conf_version = None
+        self._thread = None
+
+    @property
+    def status(self) -> str:
+        return 'Playing' if self.playing else 'Stopped'
+
+    def start(self) -> None:
+        self.ip = get_ip()
+        self._config = config_watch.watch(CONF_PATH)
+        self.poll()
+        self._thread = threading.Thread(target=self._watch_ip, name='oled-ip', daemon=True)
+        self._thread.start()
+
+    def poll(self) -> None:
+        """Cheap per-frame check: an int compare unless config.json was rewritten."""
+        version = self._config.version
+        if version != self._conf_version:
+            self._conf_version = version
+            self.playing = bool(self._config.get().get('is_playing', False))
+
+    def _watch_ip(self) -> None:
+        sock = None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+        except Exception:
+            sock = None
+        while True:
+            if sock is not None:
+                ready, _, _ = select.select([sock], [], [], IP_REFRESH_S)
+                if ready:
+                    try:
+                        sock.recv(65536)
+                    except Exception:
+                        pass
+                    # DHCP and link bring-up send bursts; settle before resolving
+                    time.sleep(0.5)
+                    while select.select([sock], [], [], 0)[0]:
+                        try:
+                            sock.recv(65536)
+                        except Exception:
+                            break
+            else:
+                time.sleep(IP_REFRESH_S)
+            self.ip = get_ip()
 
 
 def open_device():
@@ -83,12 +133,14 @@ def open_device():
 
 
 def read_levels():
-    try:
-        with open(LEVELS_PATH,'r',encoding='utf-8') as f:
-            j=json.load(f)
-        return j if (time.time()-j.get('t',0) < 0.8) else None
-    except Exception:
-        return None
+    j = LEVELS.read()
+    if j is None:
+        try:
+            with open(LEVELS_PATH,'r',encoding='utf-8') as f:
+                j=json.load(f)
+        except Exception:
+            return None
+    return j if (time.time()-j.get('t',0) < 0.8) else None
 
 
 def norm_from_db(db: float) -> float:
@@ -110,33 +162,39 @@ def main():
     except Exception:
         font = None
 
+    renderer = oled_render.OledRenderer(device, font)
+    model = StatusModel()
+    model.start()
+
     while True:
-        ip = get_ip()
-        status = get_status()
+        model.poll()
+        ip = model.ip
+        status = model.status
         j = read_levels() or {}
-        playing = load_playing()
+        playing = model.playing
         L_db = j.get('L_db', -60.0) if playing else -60.0
         R_db = j.get('R_db', -60.0) if playing else -60.0
         Lp_db = j.get('L_peak_db', L_db) if playing else -60.0
         Rp_db = j.get('R_peak_db', R_db) if playing else -60.0
         L_n = norm_from_db(L_db) if playing else 0.0
         R_n = norm_from_db(R_db) if playing else 0.0
-        with canvas(device) as draw:
-            # Header
-            draw.text((0, 0), f"IP: {ip}", fill=255, font=font)
-            draw.text((0, 16), f"{status}", fill=255, font=font)
-            # dB readout
-            # Bars
-            bw = device.width - 2
-            lh = 10
-            y0 = device.height - (2*lh + 6)
-            # Outlines
-            draw.rectangle((0, y0, bw, y0+lh), outline=255, fill=0)
-            draw.rectangle((0, y0+lh+4, bw, y0+2*lh+4), outline=255, fill=0)
-            # Fills
-            draw.rectangle((1, y0+1, int(1+(bw-2)*L_n), y0+lh-1), outline=0, fill=255)
-            draw.rectangle((1, y0+lh+5, int(1+(bw-2)*R_n), y0+2*lh+3), outline=0, fill=255)
-        time.sleep(0.06)
+        frame, draw = renderer.frame()
+        # Header
+        renderer.text(frame, draw, (0, 0), f"IP: {ip}")
+        renderer.text(frame, draw, (0, 16), f"{status}")
+        # dB readout
+        # Bars
+        bw = device.width - 2
+        lh = 10
+        y0 = device.height - (2*lh + 6)
+        # Outlines
+        draw.rectangle((0, y0, bw, y0+lh), outline=255, fill=0)
+        draw.rectangle((0, y0+lh+4, bw, y0+2*lh+4), outline=255, fill=0)
+        # Fills
+        draw.rectangle((1, y0+1, int(1+(bw-2)*L_n), y0+lh-1), outline=0, fill=255)
+        draw.rectangle((1, y0+lh+5, int(1+(bw-2)*R_n), y0+2*lh+3), outline=0, fill=255)
+        # Only changed pages go over I2C; the frame rate follows the bus budget
+        renderer.pace(renderer.show(frame))
 
 if __name__ == '__main__':
     main()
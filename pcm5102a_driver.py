@@ -4,13 +4,11 @@ PCM5102A I2S DAC Driver
 Direct ALSA driver for PCM5102A
 """
 
-import subprocess
-import struct
-import math
-import tempfile
-import os
 import time
 
+import pcm_sink
+import tone_engine
+
 class PCM5102A_Driver:
     """Direct PCM5102A driver using ALSA"""
     
@@ -18,47 +16,29 @@ class PCM5102A_Driver:
         self.device = device
         self.sample_rate = sample_rate
         self.channels = channels
-        self.format = format
+        self.format = format  # pcm_sink always writes S16_LE
+    
+    def stream(self, blocks):
+        """Write PCM blocks to the DAC as they are generated; returns (ok, error)"""
+        sink = pcm_sink.make_sink(self.device, self.sample_rate, self.channels, name='pcm5102a-test')
+        try:
+            sink.open()
+        except Exception as e:
+            return False, f'cannot open {self.device}: {e}'
+        ok = pcm_sink.play(sink, blocks)
+        return ok, None if ok else f'playback on {self.device} failed'
     
     def play_tone(self, frequency, duration=1.0, amplitude=0.9):
         """Play a tone on PCM5102A"""
-        num_samples = int(self.sample_rate * duration)
-        samples = []
-        
-        print(f'Generating {frequency}Hz tone for {duration}s...')
-        for i in range(num_samples):
-            t = float(i) / self.sample_rate
-            value = amplitude * math.sin(2.0 * math.pi * frequency * t)
-            
-            # Stereo
-            for ch in range(self.channels):
-                samples.append(int(value * 32767))
-        
-        # Convert to PCM bytes
-        audio_bytes = struct.pack('<' + 'h' * len(samples), *samples)
-        
-        # Write to temp file
-        with tempfile.NamedTemporaryFile(suffix='.raw', delete=False) as f:
-            temp_file = f.name
-            f.write(audio_bytes)
-        
-        # Play using aplay
-        print(f'Playing on PCM5102A: {self.device}...')
-        result = subprocess.run([
-            'aplay', '-D', self.device,
-            '-r', str(self.sample_rate),
-            '-c', str(self.channels),
-            '-f', self.format,
-            '-v', temp_file
-        ], capture_output=True, text=True, timeout=duration + 2)
+        print(f'Playing {frequency}Hz tone for {duration}s on PCM5102A: {self.device}...')
+        ok, err = self.stream(tone_engine.tone_blocks(frequency, duration, amplitude,
+                                                      self.sample_rate, self.channels))
         
-        os.unlink(temp_file)
-        
-        if result.returncode == 0:
+        if ok:
             print('[OK] Audio sent to PCM5102A')
             return True
         else:
-            print(f'[ERROR] {result.stderr}')
+            print(f'[ERROR] {err}')
             return False
     
     def test(self):
@@ -91,36 +71,10 @@ class PCM5102A_Driver:
         print()
         print('[Test 4/4] Playing frequency sweep...')
         duration = 3.0
-        num_samples = int(self.sample_rate * duration)
-        samples = []
-        
-        for i in range(num_samples):
-            t = float(i) / self.sample_rate
-            progress = t / duration
-            freq = 200 + (2000 - 200) * progress
-            value = 0.95 * math.sin(2.0 * math.pi * freq * t)
-            
-            for ch in range(self.channels):
-                samples.append(int(value * 32767))
-        
-        audio_bytes = struct.pack('<' + 'h' * len(samples), *samples)
-        
-        with tempfile.NamedTemporaryFile(suffix='.raw', delete=False) as f:
-            temp_file = f.name
-            f.write(audio_bytes)
-        
-        print('Playing frequency sweep...')
-        result = subprocess.run([
-            'aplay', '-D', self.device,
-            '-r', str(self.sample_rate),
-            '-c', str(self.channels),
-            '-f', self.format,
-            '-v', temp_file
-        ], capture_output=True, text=True, timeout=duration + 2)
-        
-        os.unlink(temp_file)
+        ok, _ = self.stream(tone_engine.chirp_blocks(200, 2000, duration, 0.95,
+                                                     self.sample_rate, self.channels))
         
-        if result.returncode == 0:
+        if ok:
             print('[OK] Sweep sent to PCM5102A')
         
         print()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Small DSP helpers on interleaved little-endian s16 PCM blocks.
+
+Same backend choice as level_meter: NumPy when installed, otherwise
+`audioop` (in short constant-gain segments) or plain `array` loops.
+"""
+import math
+import array
+
+from level_meter import np, audioop
+
+# fades are applied as this many constant-gain steps on the audioop path
+FADE_STEPS = 32
+# frames of the previous block a Resampler keeps (the cubic needs one before and two after a point)
+HISTORY_FRAMES = 3
+
+
+def silence(nbytes: int) -> bytes:
+    return bytes(nbytes)
+
+
+def scale(data: bytes, gain: float) -> bytes:
+    """Multiply every sample by `gain`, saturating at full scale."""
+    if gain == 1.0:
+        return data
+    if np is not None:
+        x = np.frombuffer(data, dtype='<i2').astype(np.float32) * gain
+        return np.clip(x, -32768, 32767).astype('<i2').tobytes()
+    if audioop is not None:
+        return audioop.mul(data, 2, gain)
+    x = array.array('h', data)
+    for i in range(len(x)):
+        x[i] = max(-32768, min(32767, int(x[i] * gain)))
+    return x.tobytes()
+
+
+def ramp(data: bytes, g0: float, g1: float, channels: int = 2) -> bytes:
+    """Apply a gain that moves linearly from `g0` to `g1` across the block (click-free volume changes)."""
+    if g0 == g1:
+        return scale(data, g0)
+    frames = len(data) // (2*channels)
+    if frames == 0:
+        return data
+    nbytes = frames*2*channels
+    if np is not None:
+        x = np.frombuffer(data, dtype='<i2', count=frames*channels).reshape(frames, channels).astype(np.float32)
+        gains = np.linspace(g0, g1, frames, endpoint=False, dtype=np.float32)[:, None]
+        return np.clip(x * gains, -32768, 32767).astype('<i2').tobytes()
+    if audioop is not None:
+        out = []
+        step = max(1, frames // FADE_STEPS) * 2 * channels
+        for off in range(0, nbytes, step):
+            out.append(audioop.mul(data[off:off+step], 2, g0 + (g1 - g0) * off / float(nbytes)))
+        return b''.join(out)
+    x = array.array('h', data[:nbytes])
+    for i in range(len(x)):
+        g = g0 + (g1 - g0) * (i // channels) / float(frames)
+        x[i] = max(-32768, min(32767, int(x[i] * g)))
+    return x.tobytes()
+
+
+def crossfade(a: bytes, b: bytes, channels: int = 2, start: float = 0.0, end: float = 1.0) -> bytes:
+    """Linear crossfade from block `a` to block `b` (same length).
+
+    The weight of `b` ramps from `start` to `end` across the block, so a
+    long fade can be applied one block at a time.
+    """
+    frames = len(a) // (2*channels)
+    if frames == 0:
+        return b
+    nbytes = frames*2*channels
+    if np is not None:
+        x = np.frombuffer(a, dtype='<i2', count=frames*channels).reshape(frames, channels).astype(np.float32)
+        y = np.frombuffer(b, dtype='<i2', count=frames*channels).reshape(frames, channels).astype(np.float32)
+        ramp = np.linspace(start, end, frames, endpoint=False, dtype=np.float32)[:, None]
+        out = x + (y - x) * ramp
+        return np.clip(out, -32768, 32767).astype('<i2').tobytes()
+    if audioop is not None:
+        out = []
+        step = max(1, frames // FADE_STEPS) * 2 * channels
+        for off in range(0, nbytes, step):
+            g = start + (end - start) * off / float(nbytes)
+            out.append(audioop.add(audioop.mul(a[off:off+step], 2, 1.0 - g),
+                                   audioop.mul(b[off:off+step], 2, g), 2))
+        return b''.join(out)
+    x = array.array('h', a[:nbytes])
+    y = array.array('h', b[:nbytes])
+    for i in range(len(x)):
+        g = start + (end - start) * (i // channels) / float(frames)
+        x[i] = max(-32768, min(32767, int(x[i] + (y[i] - x[i]) * g)))
+    return x.tobytes()
+
+
+# audioop.ratecv divides its rates by their gcd, which rescales the carried state whenever
+# the ratio changes; against a prime base the rates never reduce and blocks join seamlessly
+RATECV_BASE = 1000003
+
+
+def can_resample() -> bool:
+    """Whether Resampler has a fast backend (NumPy or audioop); a per-sample Python loop is too slow."""
+    return np is not None or audioop is not None
+
+
+class Resampler:
+    """Streaming fractional-rate resampler for tiny (ppm-level) clock corrections.
+
+    `process(data, ratio)` consumes `data` and returns the frames at input
+    positions `ratio` apart (ratio > 1 plays the input slightly faster).
+    With NumPy the frames are interpolated with a 4-point Catmull-Rom cubic;
+    the fractional position and the last few input frames carry over
+    between blocks, so the output is continuous and bit-exact while the
+    ratio is exactly 1. Otherwise `audioop.ratecv` (linear) does the same
+    with its own carried state. Output blocks are a frame or two longer or
+    shorter than the input. Without either backend (see can_resample) the
+    data is passed through unchanged.
+    """
+
+    def __init__(self, channels: int = 2):
+        self.channels = channels
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the history (the next block starts a new stream)."""
+        self._hist = None
+        self._pos = float(HISTORY_FRAMES)
+        self._state = None
+
+    def process(self, data: bytes, ratio: float = 1.0) -> bytes:
+        ch = self.channels
+        frames = len(data) // (2*ch)
+        if frames == 0:
+            return b''
+        if np is None:
+            if audioop is None:
+                return data[:frames*2*ch]
+            out, self._state = audioop.ratecv(data[:frames*2*ch], 2, ch, RATECV_BASE,
+                                              int(round(RATECV_BASE / ratio)), self._state)
+            return out
+        x = np.frombuffer(data, dtype='<i2', count=frames*ch).reshape(frames, ch).astype(np.float32)
+        if self._hist is None:
+            self._hist = np.repeat(x[:1], HISTORY_FRAMES, axis=0)
+        x = np.concatenate((self._hist, x))
+        self._hist = x[-HISTORY_FRAMES:]
+        # interpolating at t needs frames floor(t)-1 .. floor(t)+2
+        end = frames + HISTORY_FRAMES - 2
+        pos = self._pos
+        n = max(0, int(math.ceil((end - pos) / ratio)))
+        while n and pos + (n - 1) * ratio >= end:
+            n -= 1
+        self._pos = pos + n * ratio - frames
+        if n == 0:
+            return b''
+        if pos.is_integer() and ratio == 1.0:
+            i = int(pos)
+            return x[i:i+n].astype('<i2').tobytes()
+        t = pos + np.arange(n) * ratio
+        i = t.astype(np.int64)
+        f = (t - i).astype(np.float32)[:, None]
+        x0, x1, x2, x3 = x[i-1], x[i], x[i+1], x[i+2]
+        y = x1 + 0.5*f*(x2 - x0 + f*(2*x0 - 5*x1 + 4*x2 - x3 + f*(3*(x1 - x2) + x3 - x0)))
+        return np.clip(np.rint(y), -32768, 32767).astype('<i2').tobytes()
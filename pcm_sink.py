@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Pluggable PCM sinks for the playback engine's output stage.
+
+Device strings select the sink:
+    hw:0,0 / plughw:.. / default   aplay pipe (or pyalsaaudio with PCM_SINK=alsa)
+    alsa:<device>                  pyalsaaudio handle
+    file:<path>                    raw s16le written to a file (paced in real time)
+    null                           discard (paced in real time)
+"""
+import os
+import time
+import fcntl
+import shutil
+import subprocess
+
+from supervisor import SUPERVISOR, terminate
+
+try:
+    import alsaaudio
+except ImportError:  # pragma: no cover
+    alsaaudio = None
+
+APLAY = shutil.which('aplay') or '/usr/bin/aplay'
+DEFAULT_KIND = os.environ.get('PCM_SINK', 'aplay')
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+
+
+class Sink:
+    def __init__(self, device: str, rate: int, channels: int, name: str = 'sink',
+                 buffer_ms: int = None, period_ms: int = None):
+        """`name` identifies a helper process (if any) to the supervisor; `buffer_ms`/`period_ms`
+        size the device buffer (None: the driver's defaults)."""
+        self.device = device
+        self.rate = rate
+        self.channels = channels
+        self.name = name
+        self.buffer_ms = buffer_ms
+        self.period_ms = period_ms
+
+    def _frames(self, ms: int) -> int:
+        return max(1, self.rate * ms // 1000)
+
+    def open(self) -> None:
+        pass
+
+    def write(self, data: bytes) -> None:
+        raise NotImplementedError
+
+    def drain(self) -> None:
+        """Block until everything written so far has been played."""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class AplaySink(Sink):
+    """Raw PCM piped into `aplay`; blocking writes pace the output stage."""
+
+    def open(self) -> None:
+        argv = [APLAY, '-q', '-D', self.device, '-t', 'raw',
+                '-f', 'S16_LE', '-c', str(self.channels), '-r', str(self.rate)]
+        if self.buffer_ms:
+            argv += ['-B', str(self.buffer_ms * 1000)]
+        if self.period_ms:
+            argv += ['-F', str(self.period_ms * 1000)]
+        # unbuffered: every block goes straight into the pipe
+        self._proc = SUPERVISOR.spawn(self.name, argv, stdin=subprocess.PIPE, bufsize=0,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if self.buffer_ms:
+            # the default 64 KiB pipe alone would hold ~370 ms; keep it near the device buffer
+            try:
+                fcntl.fcntl(self._proc.stdin.fileno(), F_SETPIPE_SZ,
+                            max(4096, self._frames(self.buffer_ms) * 2 * self.channels))
+            except OSError:
+                pass
+
+    def write(self, data: bytes) -> None:
+        if self._proc.poll() is not None:
+            raise IOError('aplay exited')
+        self._proc.stdin.write(data)
+
+    def drain(self) -> None:
+        # EOF on stdin makes aplay play out its buffer and exit
+        self._proc.stdin.close()
+        if self._proc.wait(timeout=5) != 0:
+            raise IOError(f'aplay exited with status {self._proc.returncode}')
+
+    def close(self) -> None:
+        proc = getattr(self, '_proc', None)
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except Exception:
+            pass
+        terminate(proc)
+
+
+class AlsaSink(Sink):
+    """Direct ALSA playback through pyalsaaudio (no helper process)."""
+
+    PERIOD_FRAMES = 1024
+
+    def open(self) -> None:
+        if alsaaudio is None:
+            raise RuntimeError('pyalsaaudio is not installed')
+        period = self._frames(self.period_ms) if self.period_ms else self.PERIOD_FRAMES
+        kwargs = dict(device=self.device, channels=self.channels, rate=self.rate,
+                      format=alsaaudio.PCM_FORMAT_S16_LE, periodsize=period)
+        if self.buffer_ms and self.period_ms:
+            try:
+                self._pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, periods=max(2, self.buffer_ms // self.period_ms),
+                                          **kwargs)
+                return
+            except TypeError:
+                pass    # pyalsaaudio < 0.9 has no `periods`
+        self._pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, **kwargs)
+
+    def write(self, data: bytes) -> None:
+        self._pcm.write(data)
+
+    def drain(self) -> None:
+        if hasattr(self._pcm, 'drain'):
+            self._pcm.drain()
+
+    def close(self) -> None:
+        pcm = getattr(self, '_pcm', None)
+        if pcm is not None:
+            try:
+                pcm.close()
+            except Exception:
+                pass
+
+
+class NullSink(Sink):
+    """Discards audio at the real-time rate (for tests and headless runs)."""
+
+    def open(self) -> None:
+        self._next = time.monotonic()
+
+    def _pace(self, nbytes: int) -> None:
+        self._next += nbytes / float(2 * self.channels * self.rate)
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -0.5:
+            self._next = time.monotonic()
+
+    def write(self, data: bytes) -> None:
+        self._pace(len(data))
+
+
+class FileSink(NullSink):
+    def open(self) -> None:
+        super().open()
+        self._fh = open(self.device, 'ab')
+
+    def write(self, data: bytes) -> None:
+        self._fh.write(data)
+        self._pace(len(data))
+
+    def close(self) -> None:
+        fh = getattr(self, '_fh', None)
+        if fh is not None:
+            fh.close()
+
+
+def make_sink(device: str, rate: int, channels: int, name: str = 'sink',
+              buffer_ms: int = None, period_ms: int = None) -> Sink:
+    sizes = dict(buffer_ms=buffer_ms, period_ms=period_ms)
+    if device == 'null':
+        return NullSink(device, rate, channels, name, **sizes)
+    if device.startswith('file:'):
+        return FileSink(device[5:], rate, channels, name, **sizes)
+    if device.startswith('alsa:'):
+        return AlsaSink(device[5:], rate, channels, name, **sizes)
+    if DEFAULT_KIND == 'alsa' and alsaaudio is not None:
+        return AlsaSink(device, rate, channels, name, **sizes)
+    return AplaySink(device, rate, channels, name, **sizes)
+
+
+def play(sink: Sink, blocks, stop=None) -> bool:
+    """Write PCM `blocks` (any iterable, e.g. a tone_engine generator) to an opened sink, then close it.
+
+    Returns True if every block was written; stops early when the
+    `stop` Event is set or the sink fails.
+    """
+    try:
+        for block in blocks:
+            if stop is not None and stop.is_set():
+                return False
+            sink.write(block)
+        sink.drain()
+        return True
+    except Exception:
+        return False
+    finally:
+        sink.close()
+
+
+def available() -> bool:
+    return os.path.exists(APLAY) or alsaaudio is not None
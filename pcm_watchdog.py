@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Stall, throughput and silence detection on a link's decoded PCM.
+
+A link can be "up" for an HTTP probe while the decoder starves (the TCP
+stream stalls), trickles, or delivers digital silence. The watchdog is
+fed every chunk the decoder produces and judges the audio itself:
+
+    stall     no PCM for STALL_S (1 s by default; sub-second values work)
+    slow      less than MIN_RATE of real-time throughput over WINDOW_S
+    silence   every chunk below SILENCE_DBFS for SILENCE_S
+
+Thresholds come from the environment (WATCHDOG_*) so they can be tuned
+per installation, and widen with the audio buffered ahead of the output
+(`set_headroom`): a stall or shortfall the buffer absorbs is no fault, so
+the deeper latency profiles do not fail over on ordinary network jitter.
+"""
+import os
+import time
+import threading
+from collections import deque
+
+import level_meter
+
+STALL_S = float(os.environ.get('WATCHDOG_STALL_S', '1.0'))
+WINDOW_S = float(os.environ.get('WATCHDOG_WINDOW_S', '2.0'))
+MIN_RATE = float(os.environ.get('WATCHDOG_MIN_RATE', '0.8'))
+SILENCE_DBFS = float(os.environ.get('WATCHDOG_SILENCE_DBFS', '-60'))
+SILENCE_S = float(os.environ.get('WATCHDOG_SILENCE_S', '10'))   # 0 disables silence detection
+
+STALL = 'stall'
+SLOW = 'slow'
+SILENCE = 'silence'
+
+
+class PcmWatchdog:
+    def __init__(self, bytes_per_s: int, channels: int = 2, stall_s: float = STALL_S, window_s: float = WINDOW_S,
+                 min_rate: float = MIN_RATE, silence_dbfs: float = SILENCE_DBFS, silence_s: float = SILENCE_S):
+        self.bytes_per_s = bytes_per_s
+        self.channels = channels
+        self.stall_s = stall_s
+        self.window_s = window_s
+        self.min_rate = min_rate
+        self.silence_dbfs = silence_dbfs
+        self.silence_s = silence_s
+        self.headroom_s = 0.0
+        self.last_data = None           # kept across resets: a decoder restarting without output is stalled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def set_headroom(self, headroom_s: float) -> None:
+        """Seconds of audio buffered ahead of the output; a stall or shortfall smaller than that is no fault."""
+        self.headroom_s = max(0.0, headroom_s)
+
+    def _limits(self):
+        """(stall_s, window_s, min_rate) widened to the headroom."""
+        h = self.headroom_s
+        window = max(self.window_s, 2 * h)
+        return max(self.stall_s, h), window, min(self.min_rate, 1.0 - h / window)
+
+    def reset(self) -> None:
+        """Forget history (a new decoder process starts from scratch)."""
+        with self._lock:
+            self.started = None         # first chunk of the current decoder
+            self.last_loud = None
+            self._window = deque()      # (t, nbytes)
+            self._window_bytes = 0
+
+    def feed(self, data: bytes, now: float = None, levels: level_meter.Levels = None) -> None:
+        """Account one chunk; `levels` is its level_meter.measure() result if the caller already has it."""
+        now = time.monotonic() if now is None else now
+        loud = True
+        if self.silence_s > 0:
+            lv = levels or level_meter.measure(data, self.channels)
+            loud = lv.frames == 0 or level_meter.to_dbfs(max(lv.rms)) >= self.silence_dbfs
+        with self._lock:
+            if self.started is None:
+                self.started = now
+                self.last_loud = now
+            self.last_data = now
+            if loud:
+                self.last_loud = now
+            self._window.append((now, len(data)))
+            self._window_bytes += len(data)
+            window = self._limits()[1]
+            while self._window and now - self._window[0][0] > window:
+                self._window_bytes -= self._window.popleft()[1]
+
+    def rate(self, now: float = None) -> float:
+        """Throughput over the window as a fraction of real time (1.0 = exactly real time)."""
+        now = time.monotonic() if now is None else now
+        window = self._limits()[1]
+        with self._lock:
+            if self.started is None:
+                return 0.0
+            span = min(window, max(1e-3, now - self.started))
+            # chunks older than the window may still be counted until the next feed; trim here too
+            n = self._window_bytes - sum(b for t, b in self._window if now - t > window)
+        return n / (span * self.bytes_per_s)
+
+    def check(self, now: float = None):
+        """The current fault (STALL, SLOW or SILENCE), or None while audio looks healthy or has not started."""
+        now = time.monotonic() if now is None else now
+        stall_s, window, min_rate = self._limits()
+        with self._lock:
+            started, last_data, last_loud = self.started, self.last_data, self.last_loud
+        if last_data is None:
+            return None
+        if now - last_data > stall_s:
+            return STALL
+        if started is None:
+            return None
+        if now - started >= window and self.rate(now) < min_rate:
+            return SLOW
+        if self.silence_s > 0 and now - last_loud > self.silence_s:
+            return SILENCE
+        return None
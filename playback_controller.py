@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Playback state machine shared by request handlers, the job worker and the monitor.
+
+All mutable playback state (state, enabled flag, active link, failure
+count, test tone generation) lives in one immutable Snapshot. Writers
+replace it under a lock after validating the transition; readers just
+take `controller.snapshot`, a single attribute load, and never block.
+"""
+import time
+import threading
+from collections import namedtuple
+
+IDLE = 'idle'
+STARTING = 'starting'
+PLAYING = 'playing'
+FAILING_OVER = 'failing-over'
+STOPPING = 'stopping'
+
+TRANSITIONS = {
+    IDLE: {STARTING, STOPPING},
+    STARTING: {STARTING, PLAYING, IDLE, STOPPING},
+    PLAYING: {PLAYING, STARTING, FAILING_OVER, STOPPING, IDLE},   # -> idle: the output died on its own
+    FAILING_OVER: {PLAYING, IDLE, STOPPING},
+    STOPPING: {IDLE, STOPPING},
+}
+
+# since: wall time the current state was entered, seq: bumped on every change,
+# test_gen: generation of the current test tone (0 = none running)
+Snapshot = namedtuple('Snapshot', 'state enabled active_idx fail_count error test_gen since seq')
+
+
+class InvalidTransition(RuntimeError):
+    pass
+
+
+class PlaybackController:
+    def __init__(self, enabled: bool = False):
+        self._lock = threading.Lock()
+        self._test_gens = 0
+        self._callbacks = []
+        self._snap = Snapshot(IDLE, enabled, None, 0, None, 0, time.time(), 0)
+
+    @property
+    def snapshot(self) -> Snapshot:
+        return self._snap
+
+    def on_change(self, fn) -> None:
+        """Call `fn(snapshot)` after every change (outside the lock)."""
+        self._callbacks.append(fn)
+
+    def transition(self, state: str, expect: str = None, expect_seq: int = None, **fields) -> Snapshot:
+        """Move to `state` (and set `fields`); raises InvalidTransition if not allowed from the current state.
+
+        With `expect` (and `expect_seq`) this is a compare-and-set: nothing
+        happens and None is returned unless the current snapshot is still in
+        that state (with that seq), so a decision taken on an older snapshot
+        cannot overwrite a concurrent change.
+        """
+        with self._lock:
+            cur = self._snap
+            if (expect is not None and cur.state != expect) or (expect_seq is not None and cur.seq != expect_seq):
+                return None
+            if state not in TRANSITIONS[cur.state]:
+                raise InvalidTransition(f'{cur.state} -> {state}')
+            since = cur.since if state == cur.state else time.time()
+            snap = self._snap = cur._replace(state=state, since=since, seq=cur.seq + 1, **fields)
+        self._changed(snap)
+        return snap
+
+    def update(self, **fields) -> Snapshot:
+        """Change fields without changing state."""
+        with self._lock:
+            cur = self._snap
+            snap = self._snap = cur._replace(seq=cur.seq + 1, **fields)
+        self._changed(snap)
+        return snap
+
+    def record_health(self, ok: bool) -> int:
+        """Count consecutive failed health checks of the active link; returns the count."""
+        with self._lock:
+            cur = self._snap
+            count = 0 if ok else cur.fail_count + 1
+            if count == cur.fail_count:
+                return count
+            self._snap = cur._replace(fail_count=count, seq=cur.seq + 1)
+        return count
+
+    # -- test tone -------------------------------------------------------
+
+    def begin_test(self) -> int:
+        """Start a new test tone generation; older generations' timers become no-ops."""
+        with self._lock:
+            self._test_gens += 1
+            gen = self._test_gens
+            cur = self._snap
+            snap = self._snap = cur._replace(test_gen=gen, seq=cur.seq + 1)
+        self._changed(snap)
+        return gen
+
+    def end_test(self, gen: int = None) -> bool:
+        """End the test tone (only if `gen` is still current, when given); returns whether it ended."""
+        with self._lock:
+            cur = self._snap
+            if cur.test_gen == 0 or (gen is not None and gen != cur.test_gen):
+                return False
+            snap = self._snap = cur._replace(test_gen=0, seq=cur.seq + 1)
+        self._changed(snap)
+        return True
+
+    def _changed(self, snap: Snapshot) -> None:
+        for fn in list(self._callbacks):
+            try:
+                fn(snap)
+            except Exception:
+                pass
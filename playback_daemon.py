@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""The one process that owns the audio engine in production.
+
+It serves app.py's API (engine, job queue, failover monitor, SSE hub) on a
+unix socket only; the gunicorn web workers (web.py) handle logins and
+browsers and forward /api/* here. Requests on the socket are trusted, so
+the socket is created mode 0660: only the service user (and its group)
+can reach it.
+
+    python3 playback_daemon.py             # usually started by gunicorn.conf.py
+
+`keep_running()` is the master-side helper that (re)starts this daemon
+with supervisor backoff.
+"""
+import os
+import sys
+import time
+import signal
+import threading
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.environ.get('DECODER_SOCKET', os.path.join(BASE, 'playback.sock'))
+CHILD_NAME = 'playback-daemon'
+
+
+def main():
+    sys.path.insert(0, BASE)
+    from werkzeug.serving import make_server
+    import app as decoder_app
+    import auth
+
+    decoder_app.app.config[auth.TRUST_LOCAL] = True
+    decoder_app.start_services()
+    try:
+        os.unlink(SOCKET_PATH)
+    except FileNotFoundError:
+        pass
+    old_umask = os.umask(0o117)
+    try:
+        server = make_server('unix://' + SOCKET_PATH, 0, decoder_app.app, threaded=True)
+    finally:
+        os.umask(old_umask)
+    # exit through SystemExit on SIGTERM so atexit flushes pending config writes
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        try:
+            os.unlink(SOCKET_PATH)
+        except OSError:
+            pass
+
+
+def keep_running(stop: threading.Event):
+    """Start the daemon and restart it whenever it exits, until `stop` is set; returns the thread."""
+    from supervisor import SUPERVISOR, terminate
+
+    def loop():
+        argv = [sys.executable, os.path.join(BASE, 'playback_daemon.py')]
+        while not stop.is_set():
+            if not SUPERVISOR.running(CHILD_NAME):
+                child = SUPERVISOR.get(CHILD_NAME)
+                if child is not None and stop.wait(SUPERVISOR.backoff(CHILD_NAME)):
+                    break
+                SUPERVISOR.spawn(CHILD_NAME, argv, cwd=BASE)
+            stop.wait(1.0)
+        child = SUPERVISOR.get(CHILD_NAME)
+        if child is not None:
+            # give it time to flush config.json
+            terminate(child.proc, timeout=5.0)
+
+    thread = threading.Thread(target=loop, name='playback-daemon-keeper', daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_ready(timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(SOCKET_PATH):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+if __name__ == '__main__':
+    main()
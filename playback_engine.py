@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+"""Dual-input playback engine with an in-process output stage.
+
+Each link gets a PcmInput: one decoder process (ffmpeg, or mpg123 for MP3
+when ffmpeg is missing) writing raw s16le PCM into a small in-memory
+buffer, kept live whether or not it is on air. A single output thread
+takes blocks from the active input, applies gain, meters them and writes
+them to a pluggable sink (see pcm_sink). Switching links, changing volume
+or moving to another output device therefore happens between two blocks
+without reconnecting or respawning a decoder.
+
+The output levels are measured on exactly the blocks handed to the sink
+and published on the shared-memory level bus, so the OLED and the web
+meters show what the DAC plays without a second upstream connection.
+
+Every input's decoded PCM also feeds a pcm_watchdog; while a link is on
+air the output stage checks it once per block and reports stalls,
+starvation and silence through `on_fault` within the watchdog's window,
+long before an HTTP health probe would notice.
+
+How much audio is held before playing is set by a latency profile (see
+jitter_buffer): the output plays silence until the active input holds the
+profile's target depth, keeps only that much when it starts or switches,
+and rebuffers the same way after running dry. In between, each link's
+drift_control loop resamples by a few ppm so the depth stays at the
+target however far the encoder's clock and the DAC's drift apart.
+"""
+import os
+import time
+import shutil
+import subprocess
+import threading
+
+import drift_control
+import jitter_buffer
+import level_bus
+import level_meter
+import metrics
+import pcm_ops
+import pcm_sink
+import pcm_watchdog
+from supervisor import SUPERVISOR, terminate
+
+FFMPEG = shutil.which('ffmpeg') or '/usr/bin/ffmpeg'
+MPG123 = shutil.which('mpg123') or '/usr/bin/mpg123'
+
+RATE = 44100
+CHANNELS = 2
+FRAME_BYTES = 2 * CHANNELS
+BLOCK_FRAMES = 1024                     # ~23 ms per output write
+BLOCK_BYTES = BLOCK_FRAMES * FRAME_BYTES
+CROSSFADE_MS = 50
+INPUT_BUFFER_S = 2.0                    # standby inputs keep only the newest audio (profiles override)
+RESTART_DELAY_S = 1.0                   # sink reopen delay; decoders back off via the supervisor
+FRESH_S = 1.0                           # an input is usable if it produced audio this recently
+METER_ALPHA = 0.6                       # same smoothing as meter_service
+LEVELS_PUBLISH_S = 0.05                 # level bus update rate (~20 Hz)
+SINK_RESIZE = 1.5                       # adaptive profile: reopen the sink on rebuffer past this size ratio
+FAULT_REPEAT_S = 5.0                    # re-report a fault that persists (e.g. failover was not possible)
+
+# readiness: per-stage timeouts
+SPAWN_TIMEOUT_S = 2.0                   # decoder process launched
+FIRST_AUDIO_TIMEOUT_S = 10.0            # first PCM reached the sink (connect + probe + decode)
+
+
+DECODER_STARTS = metrics.REGISTRY.counter(
+    'player_starts_total', 'Link decoder processes started (first starts and restarts), per backend.', ('backend', 'input'))
+DECODED_BYTES = metrics.REGISTRY.counter(
+    'input_bytes_total', 'PCM bytes produced by link decoders (rate() gives decoded bytes/s).', ('input',))
+TTFA = metrics.REGISTRY.histogram(
+    'time_to_first_audio_seconds', 'Start or switch until the first decoded audio reached the sink.',
+    buckets=metrics.STARTUP_BUCKETS)
+REBUFFERS = metrics.REGISTRY.counter(
+    'output_rebuffers_total', 'Times the active input ran dry and the output refilled to the target depth.')
+XRUNS = metrics.REGISTRY.counter(
+    'output_xruns_total', 'Output blocks padded with silence because the active input ran dry.')
+SINK_FAILURES = metrics.REGISTRY.counter(
+    'sink_open_failures_total', 'Failed attempts to open the output device.')
+FAULTS = metrics.REGISTRY.counter(
+    'watchdog_faults_total', 'Faults reported by the PCM watchdog for the link on air.', ('reason',))
+METER_SECONDS = metrics.REGISTRY.histogram(
+    'meter_seconds', 'Metering of one output block, including the level bus update.',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025))
+
+
+def volume_gain(volume: int) -> float:
+    """Linear gain for a 0-100 volume on the ffmpeg player's curve (100 -> 0 dB, 1 -> ~-20 dB); 0 mutes."""
+    if volume <= 0:
+        return 0.0
+    return 10 ** ((20 * (volume / 100) - 20) / 20)
+
+
+def decoder_argv(url: str):
+    """Command line of the first installed decoder that emits s16le PCM on stdout."""
+    if os.path.exists(FFMPEG):
+        return [FFMPEG, '-hide_banner', '-loglevel', 'error', '-nostdin',
+                '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '10',
+                '-i', url, '-vn',
+                '-f', 's16le', '-ac', str(CHANNELS), '-ar', str(RATE), '-']
+    if os.path.exists(MPG123):
+        return [MPG123, '-q', '-s', '-e', 's16', '-r', str(RATE), '--stereo', url]
+    return None
+
+
+def available() -> bool:
+    return (os.path.exists(FFMPEG) or os.path.exists(MPG123)) and pcm_sink.available()
+
+
+class PcmInput:
+    """One link decoded to PCM continuously; the decoder is restarted (with backoff) if it exits."""
+
+    def __init__(self, url: str, buffer_s: float = INPUT_BUFFER_S, on_state=None, name: str = None,
+                 resolve=None):
+        """`on_state()` is called whenever the input becomes ready or fails; `resolve(url)` gives
+        the address the decoder actually opens (e.g. the local relay), asked on every (re)start."""
+        self.url = url
+        self.resolve = resolve
+        self.name = name or f'decoder:{url}'
+        self.max_bytes = int(buffer_s * RATE) * FRAME_BYTES
+        self.last_data = 0.0
+        self.failed = False
+        self.last_error = None
+        self.first_audio_s = None
+        self.spawned = threading.Event()
+        self.watchdog = pcm_watchdog.PcmWatchdog(RATE * FRAME_BYTES, CHANNELS)
+        self.jitter = jitter_buffer.JitterEstimator(RATE * FRAME_BYTES)
+        self.drift = drift_control.DriftController()    # kept across decoder restarts: same encoder clock
+        self._levels = ((1e-6,) * CHANNELS, (0,) * CHANNELS, 0.0)     # smoothed rms, last peak, when
+        self._on_state = on_state
+        self._t0 = time.monotonic()
+        self._buf = bytearray()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._proc = None
+        self._thread = threading.Thread(target=self._run, name=f'pcm:{url}', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        terminate(self._proc, 0)
+
+    def alive(self) -> bool:
+        proc = self._proc
+        return not self._stop.is_set() and proc is not None and proc.poll() is None
+
+    def fresh(self) -> bool:
+        return not self._stop.is_set() and time.monotonic() - self.last_data < FRESH_S
+
+    def buffered(self) -> int:
+        with self._lock:
+            return len(self._buf)
+
+    def read(self, nbytes: int) -> bytes:
+        """Up to `nbytes` of buffered PCM (whole frames); never blocks."""
+        with self._lock:
+            n = min(nbytes, len(self._buf)) // FRAME_BYTES * FRAME_BYTES
+            data = bytes(self._buf[:n])
+            del self._buf[:n]
+        return data
+
+    def levels(self):
+        """Levels of the decoded PCM in meter_service's shape (peak `L_db`/`R_db`, RMS `*_rms_db`, `age`)."""
+        rms, peak, updated = self._levels
+        age = time.monotonic() - updated
+        if age > FRESH_S:
+            return {'L_db': -60.0, 'R_db': -60.0, 'L_rms_db': -60.0, 'R_rms_db': -60.0, 'age': None}
+        return {'L_db': level_meter.to_dbfs(peak[0] / level_meter.FULL_SCALE),
+                'R_db': level_meter.to_dbfs(peak[1] / level_meter.FULL_SCALE),
+                'L_rms_db': level_meter.to_dbfs(rms[0]), 'R_rms_db': level_meter.to_dbfs(rms[1]),
+                'age': round(age, 3)}
+
+    def _meter(self, data: bytes, now: float):
+        lv = level_meter.measure(data, CHANNELS)
+        if lv.frames:
+            rms = self._levels[0]
+            rms = tuple((1 - METER_ALPHA) * old + METER_ALPHA * max(1e-6, new) for old, new in zip(rms, lv.rms))
+            self._levels = (rms, lv.peak, now)      # one assignment: readers never see a torn update
+        return lv
+
+    def trim(self, nbytes: int) -> None:
+        """Drop all but the newest `nbytes` (whole frames) to bound the latency."""
+        with self._lock:
+            over = (len(self._buf) - nbytes) // FRAME_BYTES * FRAME_BYTES
+            if over > 0:
+                del self._buf[:over]
+
+    def _state_changed(self) -> None:
+        if self._on_state is not None:
+            try:
+                self._on_state()
+            except Exception:
+                pass
+
+    def _fail(self, error) -> None:
+        if not self._stop.is_set():
+            self.failed = True
+            self.last_error = error or self.last_error or 'decoder exited'
+            self._state_changed()
+
+    def _watch_stderr(self, stream) -> None:
+        # keep the decoder's last complaint for status/errors; also keeps the pipe drained
+        for line in iter(stream.readline, b''):
+            line = line.decode('utf-8', 'replace').strip()
+            if line:
+                self.last_error = line[:200]
+        stream.close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            argv = decoder_argv(self.resolve(self.url) if self.resolve else self.url)
+            try:
+                self._proc = SUPERVISOR.spawn(self.name, argv, stdin=subprocess.DEVNULL,
+                                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            except Exception as e:
+                self._fail(f'cannot start decoder: {e}')
+                self._stop.wait(SUPERVISOR.backoff(self.name))
+                continue
+            self.spawned.set()
+            self.jitter.reset()
+            self.watchdog.reset()
+            with self._lock:
+                # a decoder killed mid-write may leave half a frame; the new one must start aligned
+                del self._buf[len(self._buf) // FRAME_BYTES * FRAME_BYTES:]
+            DECODER_STARTS.inc(backend=os.path.basename(argv[0]), input=self.name)
+            threading.Thread(target=self._watch_stderr, args=(self._proc.stderr,), daemon=True).start()
+            got = False
+            try:
+                while not self._stop.is_set():
+                    data = self._proc.stdout.read1(BLOCK_BYTES)
+                    if not data:
+                        break
+                    with self._lock:
+                        self._buf += data
+                        over = len(self._buf) - self.max_bytes
+                        if over > 0:
+                            del self._buf[:over // FRAME_BYTES * FRAME_BYTES + FRAME_BYTES]
+                    self.last_data = time.monotonic()
+                    DECODED_BYTES.inc(len(data), input=self.name)
+                    # metered once for both the link meters and the watchdog's silence check
+                    self.watchdog.feed(data, self.last_data, self._meter(data, self.last_data))
+                    self.jitter.feed(len(data), self.last_data)
+                    if not got:
+                        got = True
+                        self.failed = False
+                        if self.first_audio_s is None:
+                            self.first_audio_s = self.last_data - self._t0
+                        self._state_changed()
+            except Exception:
+                pass
+            finally:
+                terminate(self._proc)
+            if not got:
+                self._fail(None)
+            self._stop.wait(SUPERVISOR.backoff(self.name))
+
+
+class PlaybackEngine:
+    def __init__(self, device: str = 'hw:0,0', resolve=None, on_fault=None):
+        """`resolve(url)` is handed to every PcmInput (see there); `on_fault(idx, reason)` is called
+        from the output thread when the watchdog flags the input on air, so it must not block."""
+        self.device = device
+        self.resolve = resolve
+        self.on_fault = on_fault
+        self.fault = None               # current watchdog fault of the input on air
+        self._fault_at = 0.0
+        self.profile = jitter_buffer.get_profile(jitter_buffer.DEFAULT_PROFILE)
+        self._buffering = True          # filling the active input up to the target depth
+        self._resampler = pcm_ops.Resampler(CHANNELS)
+        self._on_air = None             # the PcmInput the active slot held when it went on air
+        self.inputs = {}
+        self.active_idx = None
+        self.gain = 1.0                 # target gain
+        self._gain_now = 1.0            # gain at the end of the last block written
+        self._gain_seq = 0
+        self._gain_applied = threading.Condition()
+        self._gain_applied_seq = 0
+        self._lock = threading.Lock()
+        self._pending = None
+        self._switched = threading.Event()
+        self._reopen = False
+        self._stop = threading.Event()
+        self._sink = None
+        self._thread = None
+        self._rms = [1e-6, 1e-6]
+        self._peak = [0, 0]
+        self._metered = 0.0
+        self._peak_hold = [0, 0]         # peak since the last level bus update
+        self._bus = None
+        self._published = 0.0
+        self._audio = threading.Condition()
+        self._ttfa_t0 = None
+        self._ttfa_input = None
+        self.ttfa = None                # seconds from start/switch to the first real audio at the sink
+        self.sink_error = None
+
+    # -- inputs --------------------------------------------------------
+
+    def set_input(self, idx, url: str) -> None:
+        """Decode `url` on slot `idx`, replacing whatever that slot was decoding."""
+        with self._lock:
+            cur = self.inputs.get(idx)
+            if cur is not None and cur.url == url:
+                return
+            if cur is not None:
+                cur.stop()
+            inp = PcmInput(url, buffer_s=self.profile.max_s, on_state=self._notify_audio, name=f'decoder:{idx}',
+                           resolve=self.resolve)
+            inp.start()
+            self.inputs[idx] = inp
+        if idx == self.active_idx and self.running:
+            self._new_on_air(idx)     # replaced the input on air: a cold start of the new stream
+
+    def drop_input(self, idx) -> None:
+        with self._lock:
+            inp = self.inputs.pop(idx, None)
+        if inp is not None:
+            inp.stop()
+
+    def input_levels(self, idx, url: str):
+        """Levels of slot `idx` if it is decoding `url` (see PcmInput.levels), else None."""
+        inp = self.inputs.get(idx)
+        if inp is None or inp.url != url:
+            return None
+        return inp.levels()
+
+    def input_fresh(self, idx) -> bool:
+        inp = self.inputs.get(idx)
+        return inp is not None and inp.fresh()
+
+    def set_profile(self, name: str) -> None:
+        """Switch latency profile; the sink is reopened with the profile's ALSA sizes (see jitter_buffer.sink_sizes)."""
+        profile = jitter_buffer.get_profile(name)
+        if profile == self.profile:
+            return
+        self.profile = profile
+        with self._lock:
+            for inp in self.inputs.values():
+                inp.max_bytes = int(profile.max_s * RATE) * FRAME_BYTES
+        self._buffering = True
+        self._reopen = True
+
+    def target_s(self, idx) -> float:
+        """Depth the output fills input `idx` to before playing it."""
+        if self.profile.target_s is not None:
+            return self.profile.target_s
+        inp = self.inputs.get(idx)
+        if inp is None:
+            return jitter_buffer.ADAPTIVE_MIN_S
+        return inp.jitter.target(hi=min(jitter_buffer.ADAPTIVE_MAX_S, self.profile.max_s * 0.75))
+
+    def buffer_status(self) -> dict:
+        """Depth, target and measured jitter (ms) of every input, for /api/status."""
+        out = {}
+        for idx, inp in list(self.inputs.items()):
+            out[idx] = {'depth_ms': round(inp.buffered() * 1000 / (RATE * FRAME_BYTES)),
+                        'target_ms': round(self.target_s(idx) * 1000),
+                        'jitter_ms': round(inp.jitter.jitter() * 1000),
+                        'drift_ppm': round(inp.drift.drift_ppm, 1),
+                        'correction_ppm': round(inp.drift.ppm, 1)}
+        return out
+
+    def input_ok(self, idx) -> bool:
+        """Decoding, and the watchdog has nothing against it (a failover target)."""
+        inp = self.inputs.get(idx)
+        return inp is not None and inp.fresh() and inp.watchdog.check() is None
+
+    # -- output --------------------------------------------------------
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_volume(self, volume: int, timeout: float = 0.0) -> bool:
+        """Set the output gain; it is ramped in over the next block to avoid clicks.
+
+        With a timeout, waits until the block carrying the new gain has been
+        handed to the sink and returns whether that happened in time. When
+        the output is stopped the gain simply applies from the next start.
+        """
+        with self._gain_applied:
+            self.gain = volume_gain(volume)
+            self._gain_seq += 1
+            seq = self._gain_seq
+            if not self.running:
+                self._gain_now = self.gain
+                self._gain_applied_seq = seq
+                return True
+            if timeout <= 0:
+                return False
+            return self._gain_applied.wait_for(lambda: self._gain_applied_seq >= seq, timeout)
+
+    def set_device(self, device: str) -> None:
+        """Move the output to another device; the sink is reopened between two blocks."""
+        if device and device != self.device:
+            self.device = device
+            self._reopen = True
+
+    def start(self, idx, device: str = None, volume: int = None) -> bool:
+        """Put slot `idx` on air, starting the output stage if needed."""
+        if volume is not None:
+            self.set_volume(volume)
+        if device:
+            self.set_device(device)
+        if self.running:
+            return self.select(idx, require_fresh=False)
+        self.active_idx = idx
+        self._new_on_air(idx)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._output_loop, name='pcm-output', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        sink = self._sink
+        if sink is not None:
+            sink.close()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+        # readers drop to silence at once instead of waiting for the last frame to go stale
+        self._publish_levels(silent=True)
+
+    def shutdown(self) -> None:
+        self.stop()
+        for idx in list(self.inputs):
+            self.drop_input(idx)
+
+    def select(self, idx, timeout: float = 0.2, require_fresh: bool = True) -> bool:
+        """Crossfade the output to slot `idx`; returns once the fade has started."""
+        if idx == self.active_idx:
+            if self.inputs.get(idx) is not self._on_air:
+                self._new_on_air(idx)
+            return True
+        if not self.running or idx not in self.inputs:
+            return False
+        if require_fresh and not self.input_fresh(idx):
+            return False
+        self._switched.clear()
+        self._arm_ttfa(idx)
+        with self._lock:
+            self._pending = idx
+        return self._switched.wait(timeout)
+
+    def _new_on_air(self, idx) -> None:
+        """Slot `idx` (already active) now plays a different input: buffer it and time its first audio."""
+        self._on_air = self.inputs.get(idx)
+        self.fault = None
+        self._buffering = True
+        self._hold_drift(idx)
+        self._arm_ttfa(idx)
+
+    def _arm_ttfa(self, idx) -> None:
+        with self._audio:
+            self._ttfa_t0 = time.monotonic()
+            self._ttfa_input = self.inputs.get(idx)
+            self.ttfa = None
+
+    def _notify_audio(self) -> None:
+        with self._audio:
+            self._audio.notify_all()
+
+    def _active_failed(self) -> bool:
+        inp = self.inputs.get(self.active_idx)
+        return inp is None or inp.failed or self.sink_error is not None or not self.running
+
+    def wait_audio(self, timeout: float = FIRST_AUDIO_TIMEOUT_S) -> bool:
+        """Block until the active input's audio reaches the sink (True) or it fails / times out (False)."""
+        with self._audio:
+            self._audio.wait_for(lambda: self.ttfa is not None or self._active_failed(), timeout)
+            return self.ttfa is not None
+
+    def levels(self):
+        """Output levels as a levels.json-style dict, or None when nothing was metered recently."""
+        if time.monotonic() - self._metered > FRESH_S:
+            return None
+        rms = self._rms
+        peak = self._peak
+        return {'t': time.time(),
+                'L_db': level_meter.to_dbfs(rms[0]), 'R_db': level_meter.to_dbfs(rms[1]),
+                'L_peak_db': level_meter.to_dbfs(peak[0] / level_meter.FULL_SCALE),
+                'R_peak_db': level_meter.to_dbfs(peak[1] / level_meter.FULL_SCALE)}
+
+    def _publish_levels(self, silent: bool = False) -> None:
+        frame = None if silent else self.levels()
+        if frame is None:
+            frame = {'t': time.time(), 'L_db': -60.0, 'R_db': -60.0, 'L_peak_db': -60.0, 'R_peak_db': -60.0}
+        try:
+            if self._bus is None:
+                self._bus = level_bus.LevelBus.create()
+            self._bus.publish(frame['L_db'], frame['R_db'], frame['L_peak_db'], frame['R_peak_db'], frame['t'])
+        except Exception:
+            self._bus = None
+
+    def _target_bytes(self, idx) -> int:
+        return int(self.target_s(idx) * RATE) * FRAME_BYTES
+
+    def _filled(self, idx) -> bool:
+        """While buffering: whether input `idx` reached the target depth (then trimmed to it)."""
+        inp = self.inputs.get(idx)
+        target = self._target_bytes(idx)
+        if inp is None or inp.buffered() < target:
+            return False
+        inp.trim(target)
+        return True
+
+    def _hold_drift(self, idx) -> None:
+        """Leave the resampled path: the next block of `idx` starts a fresh stream."""
+        self._resampler.reset()
+        inp = self.inputs.get(idx)
+        if inp is not None:
+            inp.drift.hold()
+
+    def _drift_corrected(self, idx, block: bytes) -> bytes:
+        """`block` of the input on air, resampled to keep its buffer at the target depth."""
+        inp = self.inputs.get(idx)
+        if inp is None or not inp.drift.enabled:
+            return block
+        ratio = inp.drift.update(inp.buffered() / (RATE * FRAME_BYTES), self.target_s(idx))
+        return self._resampler.process(block, ratio)
+
+    def _next_block(self, inp):
+        """(block, real_bytes): one output block from input `inp`, padded with silence on underrun."""
+        data = inp.read(BLOCK_BYTES) if inp is not None else b''
+        real = len(data)
+        if real < BLOCK_BYTES:
+            data += pcm_ops.silence(BLOCK_BYTES - real)   # underrun: pad rather than stall the DAC
+        return data, real
+
+    def _audio_flowing(self, inp) -> None:
+        # by input, not slot: a block read from an input just replaced on the same slot does not count
+        if self.ttfa is None and self._ttfa_t0 is not None and inp is self._ttfa_input:
+            with self._audio:
+                self.ttfa = time.monotonic() - self._ttfa_t0
+                self._audio.notify_all()
+            TTFA.observe(self.ttfa)
+
+    def _emit(self, sink, block: bytes) -> None:
+        with self._gain_applied:
+            target = self.gain
+            seq = self._gain_seq
+        block = pcm_ops.ramp(block, self._gain_now, target, CHANNELS)
+        self._gain_now = target
+        # meter the exact samples going to the DAC (after gain)
+        t0 = time.monotonic()
+        lv = level_meter.measure(block, CHANNELS)
+        self._rms = [(1-METER_ALPHA)*self._rms[c] + METER_ALPHA*max(1e-6, lv.rms[c]) for c in range(CHANNELS)]
+        self._peak_hold = [max(a, b) for a, b in zip(self._peak_hold, lv.peak)]
+        self._metered = t0
+        if t0 - self._published >= LEVELS_PUBLISH_S:
+            self._published = t0
+            self._peak, self._peak_hold = self._peak_hold, [0, 0]
+            self._publish_levels()
+        METER_SECONDS.observe(time.monotonic() - t0)
+        sink.write(block)
+        if seq != self._gain_applied_seq:
+            with self._gain_applied:
+                self._gain_applied_seq = seq
+                self._gain_applied.notify_all()
+
+    def _resize_sink(self, buffer_ms: int) -> bool:
+        """Whether the sink sized `buffer_ms` is off the current jitter by more than SINK_RESIZE."""
+        want = jitter_buffer.sink_sizes(self.profile, self.target_s(self.active_idx))[0]
+        return not buffer_ms / SINK_RESIZE <= want <= buffer_ms * SINK_RESIZE
+
+    def _watch(self) -> None:
+        inp = self.inputs.get(self.active_idx)
+        if inp is None or self.ttfa is None:
+            return
+        now = time.monotonic()
+        inp.watchdog.set_headroom(self.target_s(self.active_idx))
+        reason = inp.watchdog.check(now)
+        if reason is None or (reason == self.fault and now - self._fault_at < FAULT_REPEAT_S):
+            self.fault = reason
+            return
+        self.fault = reason
+        self._fault_at = now
+        FAULTS.inc(reason=reason)
+        if self.on_fault is not None:
+            try:
+                self.on_fault(self.active_idx, reason)
+            except Exception:
+                pass
+
+    def _output_loop(self) -> None:
+        fade_blocks = max(1, CROSSFADE_MS * RATE // 1000 // BLOCK_FRAMES)
+        while not self._stop.is_set():
+            self._reopen = False
+            buffer_ms, period_ms = jitter_buffer.sink_sizes(self.profile, self.target_s(self.active_idx))
+            sink = pcm_sink.make_sink(self.device, RATE, CHANNELS, buffer_ms=buffer_ms, period_ms=period_ms)
+            try:
+                sink.open()
+            except Exception as e:
+                self.sink_error = f'cannot open {self.device}: {e}'
+                SINK_FAILURES.inc()
+                self._notify_audio()
+                self._stop.wait(RESTART_DELAY_S)
+                continue
+            self.sink_error = None
+            self._sink = sink
+            try:
+                while not self._stop.is_set() and not self._reopen:
+                    with self._lock:
+                        pending, self._pending = self._pending, None
+                    if pending is not None and pending != self.active_idx:
+                        old = self.active_idx
+                        self.active_idx = pending
+                        self.fault = None
+                        # taken before select() returns, so the caller may drop the old slot at once
+                        fading = self.inputs.get(old)
+                        self._switched.set()
+                        # a standby input holds up to max_s; play it at the target latency instead
+                        inp = self._on_air = self.inputs.get(pending)
+                        if inp is not None:
+                            inp.trim(self._target_bytes(pending))
+                        self._buffering = False
+                        self._hold_drift(old)
+                        self._hold_drift(pending)
+                        for i in range(fade_blocks):
+                            a, _ = self._next_block(fading)
+                            b, real = self._next_block(inp)
+                            # each block carries one slice of a single linear ramp
+                            self._emit(sink, pcm_ops.crossfade(a, b, CHANNELS, i / fade_blocks, (i + 1) / fade_blocks))
+                            if real:
+                                self._audio_flowing(inp)
+                        continue
+                    if pending is not None:
+                        self._switched.set()
+                    if self._buffering:
+                        if not self._filled(self.active_idx):
+                            self._emit(sink, pcm_ops.silence(BLOCK_BYTES))
+                            self._watch()
+                            continue
+                        self._buffering = False
+                    inp = self.inputs.get(self.active_idx)
+                    block, real = self._next_block(inp)
+                    if real < BLOCK_BYTES and self.ttfa is not None:
+                        XRUNS.inc()     # not while still waiting for the first audio
+                        if real == 0:
+                            REBUFFERS.inc()
+                            self._buffering = True
+                            # already silent: the moment to resize an adaptive sink to the jitter seen since
+                            self._reopen = self._resize_sink(buffer_ms)
+                    if real == BLOCK_BYTES:
+                        block = self._drift_corrected(self.active_idx, block)
+                    else:
+                        self._hold_drift(self.active_idx)
+                    self._emit(sink, block)
+                    if real:
+                        self._audio_flowing(inp)
+                    self._watch()
+            except Exception:
+                self._stop.wait(0.2)
+            finally:
+                sink.close()
+                self._sink = None
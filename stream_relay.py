@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""Loopback relay: one upstream connection per configured link, fanned out over localhost.
+
+A pump thread per URL keeps a single HTTP connection to the upstream
+server and appends what it reads (still encoded) to a short ring. Local
+consumers - the engine's decoders and the /api/levels meters - fetch
+http://127.0.0.1:<port>/s/<id> instead of the upstream URL; each gets the
+ring first (burst-on-connect, so a decoder can probe the format at once)
+and then live data, so Icecast sees one listener per link however many
+consumers we run. The pump's state doubles as the link's health. When the
+upstream connection is re-established, local responses are ended so
+consumers reconnect at the start of the new stream.
+
+Only plain continuous streams are relayed: playlists (HLS and friends)
+reference further URLs and are left to the decoder, and while a pump is
+not delivering, consumers get the upstream URL itself. Ogg and FLAC
+streams carry their codec headers once at the start; those are kept and
+sent ahead of the ring to consumers that join after they left it.
+SHOUTcast's `ICY 200 OK` status line is accepted as HTTP/1.0.
+"""
+import os
+import time
+import hashlib
+import threading
+import http.client
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+from urllib.request import HTTPHandler, Request, build_opener
+from urllib.error import HTTPError
+
+from link_prober import ProbeResult
+
+HOST = '127.0.0.1'
+PORT = int(os.environ.get('RELAY_PORT', '0'))      # 0: any free port
+CHUNK_BYTES = 4096
+BURST_BYTES = 64 * 1024         # ~4 s at 128 kbit/s
+READ_TIMEOUT_S = 10.0           # upstream connect/read; a stall this long forces a reconnect
+FRESH_S = 3.0                   # healthy while upstream data arrived this recently
+BACKOFF_INITIAL_S = 0.5
+BACKOFF_MAX_S = 30.0
+STABLE_S = 10.0
+HEADER_MAX_BYTES = 256 * 1024   # Ogg/FLAC headers (cover art included) kept for late consumers
+PLAYLIST_EXTS = ('.m3u8', '.m3u', '.pls', '.xspf', '.asx')
+PLAYLIST_TYPES = ('mpegurl', 'scpls', 'xspf', 'ms-asf')
+
+
+class _IcyResponse(http.client.HTTPResponse):
+    """Reads SHOUTcast v1's `ICY 200 OK` status line as HTTP/1.0."""
+
+    def _read_status(self):
+        if self.fp.peek(4)[:4] != b'ICY ':
+            return super()._read_status()
+        line = str(self.fp.readline(http.client._MAXLINE + 1), 'iso-8859-1')
+        parts = line.split(None, 2)
+        try:
+            status = int(parts[1])
+        except (IndexError, ValueError):
+            raise http.client.BadStatusLine(line)
+        return 'HTTP/1.0', status, parts[2].strip() if len(parts) > 2 else ''
+
+
+class _IcyConnection(http.client.HTTPConnection):
+    response_class = _IcyResponse
+
+
+class _IcyHandler(HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_IcyConnection, req)
+
+
+_OPENER = build_opener(_IcyHandler)
+
+
+def relayable(url: str) -> bool:
+    """Whether `url` looks like a continuous HTTP stream (not a playlist) the relay can fan out."""
+    parts = urlsplit(url)
+    return parts.scheme in ('http', 'https') and not parts.path.lower().endswith(PLAYLIST_EXTS)
+
+
+class _StreamHeaders:
+    """Codec headers at the start of an Ogg (Vorbis, Opus, FLAC) or native FLAC stream.
+
+    Fed every chunk with its ring sequence number. Ogg is followed page by
+    page so a new chain link (fresh BOS pages, e.g. at a track change)
+    replaces the headers; MP3/AAC streams have none and are not parsed.
+    """
+
+    def __init__(self):
+        self.data = b''             # the complete headers, once seen
+        self.first_seq = None       # ring chunk the headers start in
+        self.last_seq = None        # ring chunk they are complete in
+        self._kind = None           # 'ogg', 'flac', or '' (nothing to keep)
+        self._pending = b''
+        self._pages = []
+        self._prev_bos = False
+
+    def feed(self, seq: int, data: bytes) -> None:
+        if self._kind == '':
+            return
+        self._pending += data
+        if self._kind is None:
+            if len(self._pending) < 4:
+                return
+            magic = self._pending[:4]
+            self._kind = 'ogg' if magic == b'OggS' else 'flac' if magic == b'fLaC' else ''
+            self.first_seq = seq
+        if self._kind == 'ogg':
+            self._feed_ogg(seq)
+        elif self._kind == 'flac':
+            self._feed_flac(seq)
+        else:
+            self._pending = b''
+        if len(self._pending) > HEADER_MAX_BYTES:
+            self._kind, self._pending = '', b''
+
+    def _feed_flac(self, seq: int) -> None:
+        buf = self._pending
+        pos = 4
+        # metadata blocks: 1 byte type (0x80: last), 3 bytes length
+        while len(buf) >= pos + 4:
+            end = pos + 4 + int.from_bytes(buf[pos+1:pos+4], 'big')
+            if len(buf) < end:
+                return
+            last = buf[pos] & 0x80
+            pos = end
+            if last:
+                self.data, self.last_seq = buf[:pos], seq
+                self._kind, self._pending = '', b''
+                return
+
+    def _feed_ogg(self, seq: int) -> None:
+        buf = self._pending
+        while True:
+            i = buf.find(b'OggS')
+            if i < 0:
+                buf = buf[-3:]
+                break
+            buf = buf[i:]
+            if len(buf) < 27 or len(buf) < 27 + buf[26]:
+                break
+            nsegs = buf[26]
+            size = 27 + nsegs + sum(buf[27:27+nsegs])
+            if len(buf) < size:
+                break
+            self._page(seq, buf[:size])
+            buf = buf[size:]
+        self._pending = buf
+
+    def _page(self, seq: int, page: bytes) -> None:
+        bos = bool(page[5] & 0x02)
+        granule = int.from_bytes(page[6:14], 'little')
+        if bos:
+            if not self._prev_bos:
+                self._pages, self.first_seq, self.last_seq = [], seq, None
+            self._pages.append(page)
+        elif self.last_seq is None and self._pages:
+            # header pages carry no audio: granule 0 (or -1 while a packet continues)
+            if granule in (0, 0xFFFFFFFFFFFFFFFF):
+                self._pages.append(page)
+            else:
+                self.data, self.last_seq, self._pages = b''.join(self._pages), seq, []
+        self._prev_bos = bos
+
+
+class _Pump:
+    """One upstream connection and its ring of recent bytes."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.id = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+        self.relayable = True           # cleared when upstream turns out to serve a playlist
+        self.content_type = 'application/octet-stream'
+        self.status = None
+        self.connected = False
+        self.connect_ms = None
+        self.ttfb_ms = None
+        self.error = None
+        self.last_data = 0.0
+        self.connects = 0
+        self.bytes_in = 0
+        self.clients = 0
+        self._chunks = deque()          # (seq, bytes), oldest first
+        self._ring_bytes = 0
+        self._seq = 0
+        self._generation = 0            # bumped on every (re)connect and disconnect
+        self._headers = _StreamHeaders()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._resp = None
+        self._thread = threading.Thread(target=self._run, name=f'relay:{self.id}', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        resp = self._resp
+        if resp is not None:
+            try:
+                resp.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def result(self) -> ProbeResult:
+        now = time.monotonic()
+        ok = self.connected and now - self.last_data < FRESH_S
+        error = None if ok else (self.error or ('stalled' if self.connected else 'connecting'))
+        # the connection was timed once; what ages is its data
+        age_ms = round((now - self.last_data) * 1000.0, 1) if self.last_data else None
+        return ProbeResult(self.url, ok, self.status, age_ms, self.ttfb_ms, error, now, 'relay')
+
+    def info(self) -> dict:
+        return {'id': self.id, 'connected': self.connected, 'status': self.status, 'clients': self.clients,
+                'connects': self.connects, 'bytes_in': self.bytes_in, 'error': self.error,
+                'relayed': self.relayable}
+
+    def _disconnected(self, error) -> None:
+        with self._cond:
+            self.connected = False
+            self.error = error
+            self._generation += 1
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            t0 = time.monotonic()
+            try:
+                req = Request(self.url, headers={'User-Agent': 'Mozilla/5.0', 'Icy-MetaData': '0'})
+                resp = self._resp = _OPENER.open(req, timeout=READ_TIMEOUT_S)
+                self.status = getattr(resp, 'status', None)
+                self.connect_ms = round((time.monotonic() - t0) * 1000.0, 1)
+                self.ttfb_ms = None
+                content_type = resp.headers.get('Content-Type') or self.content_type
+                if any(t in content_type.lower() for t in PLAYLIST_TYPES):
+                    # a playlist points elsewhere: consumers must open the URL themselves
+                    self.relayable = False
+                    self._disconnected('playlist, not relayed')
+                    return
+                with self._cond:
+                    self.content_type = content_type
+                    self._chunks.clear()
+                    self._ring_bytes = 0
+                    self._headers = _StreamHeaders()
+                    self._generation += 1
+                self.connects += 1
+                while not self._stop.is_set():
+                    data = resp.read1(CHUNK_BYTES)
+                    if not data:
+                        break
+                    now = time.monotonic()
+                    if self.ttfb_ms is None:
+                        self.ttfb_ms = round((now - t0) * 1000.0, 1)
+                    with self._cond:
+                        if not self.connected:
+                            self.connected = True
+                            self.error = None
+                        self._seq += 1
+                        self._chunks.append((self._seq, data))
+                        self._headers.feed(self._seq, data)
+                        self._ring_bytes += len(data)
+                        while self._ring_bytes - len(self._chunks[0][1]) >= BURST_BYTES:
+                            self._ring_bytes -= len(self._chunks.popleft()[1])
+                        self.last_data = now
+                        self.bytes_in += len(data)
+                        self._cond.notify_all()
+                self._disconnected('upstream closed the stream')
+            except HTTPError as e:
+                self.status = e.code
+                self._disconnected(str(e))
+            except Exception as e:
+                self._disconnected(str(e) or e.__class__.__name__)
+            finally:
+                resp, self._resp = self._resp, None
+                if resp is not None:
+                    try:
+                        resp.close()
+                    except Exception:
+                        pass
+            # same policy as the supervisor: double on quick failures, reset once stable
+            failures = 0 if time.monotonic() - t0 >= STABLE_S else failures + 1
+            self._stop.wait(min(BACKOFF_MAX_S, BACKOFF_INITIAL_S * (2 ** max(0, failures - 1))))
+
+    def serve(self, handler) -> None:
+        """Stream the ring and then live data to one local client until either side goes away."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.connected or self._stop.is_set(), READ_TIMEOUT_S) \
+                    or self._stop.is_set():
+                handler.send_error(503, 'upstream not connected')
+                return
+            generation = self._generation
+            backlog = [data for _, data in self._chunks]
+            headers = self._headers
+            if headers.last_seq is not None and self._chunks and self._chunks[0][0] > headers.first_seq:
+                # the ring no longer starts with the codec headers: send them, then whole chunks after them
+                backlog = [headers.data] + [data for seq, data in self._chunks if seq > headers.last_seq]
+            next_seq = self._seq + 1
+            content_type = self.content_type
+            self.clients += 1
+        try:
+            handler.send_response(200)
+            handler.send_header('Content-Type', content_type)
+            handler.send_header('Cache-Control', 'no-cache')
+            handler.end_headers()
+            handler.wfile.write(b''.join(backlog))
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq >= next_seq or self._generation != generation,
+                                        READ_TIMEOUT_S)
+                    if self._generation != generation:
+                        return
+                    # a client that fell behind the ring skips to its oldest chunk
+                    new = [data for seq, data in self._chunks if seq >= next_seq]
+                    next_seq = self._seq + 1
+                if new:
+                    handler.wfile.write(b''.join(new))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.0'
+
+    def do_GET(self):
+        parts = self.path.split('?', 1)[0].strip('/').split('/')
+        pump = self.server.relay._pump_by_id(parts[1]) if len(parts) == 2 and parts[0] == 's' else None
+        if pump is None:
+            self.send_error(404)
+            return
+        pump.serve(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StreamRelay:
+    def __init__(self, urls_fn, host: str = HOST, port: int = PORT):
+        """`urls_fn()` returns the links to relay (empty strings are skipped); other URLs pass through."""
+        self.urls_fn = urls_fn
+        self.host = host
+        self.port = port
+        self._pumps = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def local_url(self, url: str) -> str:
+        """URL a local consumer should open for `url`: the relay for configured links that are streaming
+        through it, else `url` itself."""
+        if not url or url not in self.urls_fn() or not relayable(url):
+            return url
+        with self._lock:
+            pump = self._pump_for(url)
+            if pump is None:
+                return url
+            port = self._server.server_address[1]
+        if not pump.relayable or not pump.result().ok:
+            return url
+        return f'http://{self.host}:{port}/s/{pump.id}'
+
+    def result(self, url: str):
+        """Health of `url` as seen by its pump (a ProbeResult), or None when it is not relayed."""
+        with self._lock:
+            pump = self._pumps.get(url)
+        return pump.result() if pump is not None and pump.relayable else None
+
+    def sync(self) -> None:
+        """Connect every configured link and close the connections of links that were removed."""
+        keep = [u for u in dict.fromkeys(self.urls_fn()) if u and relayable(u)]
+        with self._lock:
+            dropped = [self._pumps.pop(u) for u in list(self._pumps) if u not in keep]
+            for url in keep:
+                self._pump_for(url)
+        for pump in dropped:
+            pump.stop()
+
+    def stats(self):
+        with self._lock:
+            pumps = list(self._pumps.values())
+        return [p.info() for p in pumps]
+
+    def _pump_by_id(self, pump_id: str):
+        with self._lock:
+            for pump in self._pumps.values():
+                if pump.id == pump_id:
+                    return pump
+        return None
+
+    def _pump_for(self, url: str):
+        # caller holds self._lock
+        if not self._ensure_server():
+            return None
+        pump = self._pumps.get(url)
+        if pump is None:
+            pump = self._pumps[url] = _Pump(url)
+            pump.start()
+        return pump
+
+    def _ensure_server(self) -> bool:
+        if self._server is not None:
+            return True
+        try:
+            server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        except OSError:
+            return False
+        server.daemon_threads = True
+        server.relay = self
+        self._server = server
+        threading.Thread(target=server.serve_forever, name='stream-relay', daemon=True).start()
+        return True
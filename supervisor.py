@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Owner of every helper process (decoders, sinks, meters, test tones).
+
+Children are started in their own process group and tracked by name and
+PID, so stopping one is a killpg() on a known PID instead of a `pkill -f`
+regex over the whole process table. Owners that restart a child after it
+exits ask `backoff(name)` how long to wait: the delay doubles on every
+quick crash and resets once the child has stayed up for STABLE_S.
+"""
+import os
+import time
+import signal
+import subprocess
+import threading
+
+REAP_INTERVAL_S = 1.0
+BACKOFF_INITIAL_S = 0.5
+BACKOFF_MAX_S = 30.0
+STABLE_S = 10.0
+
+
+def terminate(proc: subprocess.Popen, timeout: float = 1.0) -> None:
+    """SIGTERM the process group of `proc`, escalating to SIGKILL after `timeout` (0: don't wait)."""
+    if proc is None or proc.poll() is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+    if timeout <= 0:
+        return
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            proc.wait(timeout=timeout)
+        except Exception:
+            pass
+
+
+class Child:
+    def __init__(self, name: str, argv):
+        self.name = name
+        self.argv = list(argv)
+        self.proc = None
+        self.started_at = None
+        self.starts = 0
+        self.quick_failures = 0
+        self.last_exit = None
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.proc is not None else None
+
+    def running(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def info(self) -> dict:
+        running = self.running()
+        return {
+            'name': self.name,
+            'pid': self.pid if running else None,
+            'running': running,
+            'uptime_s': round(time.monotonic() - self.started_at, 1) if running else None,
+            'restarts': max(0, self.starts - 1),
+            'last_exit': self.last_exit,
+            'cmd': os.path.basename(self.argv[0]) if self.argv else None,
+        }
+
+
+class Supervisor:
+    def __init__(self):
+        self._children = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def spawn(self, name: str, argv, **popen_kwargs) -> subprocess.Popen:
+        """Start `argv` as child `name` in a new process group, replacing a running one."""
+        with self._lock:
+            child = self._children.get(name)
+        if child is not None and child.running():
+            self.stop(name)
+        proc = subprocess.Popen(argv, start_new_session=True, **popen_kwargs)
+        with self._lock:
+            child = self._children.get(name)
+            if child is None:
+                child = self._children[name] = Child(name, argv)
+            child.argv = list(argv)
+            child.proc = proc
+            child.started_at = time.monotonic()
+            child.starts += 1
+            child.last_exit = None
+            self._ensure_reaper()
+        return proc
+
+    def get(self, name: str):
+        with self._lock:
+            return self._children.get(name)
+
+    def running(self, name: str) -> bool:
+        child = self.get(name)
+        return child is not None and child.running()
+
+    def stop(self, name: str, timeout: float = 1.0) -> None:
+        """Terminate child `name` and its process group (SIGTERM, then SIGKILL after `timeout`)."""
+        child = self.get(name)
+        if child is None or child.proc is None:
+            return
+        terminate(child.proc, timeout)
+        self._record_exit(child)
+
+    def forget(self, name: str) -> None:
+        """Stop child `name` and drop its statistics (for links that were removed)."""
+        self.stop(name)
+        with self._lock:
+            self._children.pop(name, None)
+
+    def stop_all(self, prefix: str = '') -> None:
+        with self._lock:
+            names = [n for n in self._children if n.startswith(prefix)]
+        for name in names:
+            self.stop(name)
+
+    def backoff(self, name: str) -> float:
+        """Delay before restarting child `name` after it exited."""
+        child = self.get(name)
+        if child is None:
+            return BACKOFF_INITIAL_S
+        if child.started_at is not None and time.monotonic() - child.started_at >= STABLE_S:
+            child.quick_failures = 0
+        else:
+            child.quick_failures += 1
+        return min(BACKOFF_MAX_S, BACKOFF_INITIAL_S * (2 ** max(0, child.quick_failures - 1)))
+
+    def stats(self):
+        with self._lock:
+            children = list(self._children.values())
+        for child in children:
+            self._record_exit(child)
+        return [c.info() for c in children]
+
+    def _record_exit(self, child: Child) -> None:
+        proc = child.proc
+        if proc is not None and child.last_exit is None:
+            code = proc.poll()
+            if code is not None:
+                child.last_exit = code
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, name='supervisor', daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        # poll() collects exit statuses so exited children never linger as zombies
+        while True:
+            time.sleep(REAP_INTERVAL_S)
+            with self._lock:
+                children = list(self._children.values())
+            for child in children:
+                self._record_exit(child)
+
+
+SUPERVISOR = Supervisor()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Test-signal synthesis for the DAC: tones, multitones, chirps and pink noise.
+
+Periodic signals are synthesised once as one exact period (the smallest
+number of samples after which every partial lines up again), cached by
+(frequencies, rate, amplitude, channels) and tiled into the requested
+length, so a 60 s tone costs one period of maths plus a bytes repeat.
+Same backend choice as level_meter: NumPy when installed, otherwise
+`array` loops over the single period.
+
+The *_blocks() generators yield the same signals lazily, one block at a
+time, so a long tone can be piped into a sink in constant memory and
+starts playing as soon as the first block is ready.
+"""
+import math
+import array
+import random
+from fractions import Fraction
+from functools import lru_cache
+
+from level_meter import np
+
+RATE = 44100
+CHANNELS = 2
+FULL_SCALE = 32767
+MAX_PERIOD = RATE * 4          # longest exact period worth caching; beyond that frequencies snap to 1 Hz
+PINK_PERIOD = 1 << 16          # ~1.5 s noise loop at 44.1 kHz
+BLOCK_FRAMES = 4096            # ~93 ms per streamed block
+
+
+def _period(freq: float, rate: int):
+    """Samples after which sin(2*pi*freq*n/rate) repeats exactly, or None if longer than MAX_PERIOD."""
+    fr = Fraction(freq).limit_denominator(1000)
+    if fr <= 0:
+        return 1
+    n = fr.denominator * rate // math.gcd(fr.numerator, fr.denominator * rate)
+    return n if n <= MAX_PERIOD else None
+
+
+def _common_period(freqs, rate: int):
+    """(samples, snap): exact common period of `freqs`, and whether they must be snapped to 1 Hz first."""
+    n = 1
+    for f in freqs:
+        p = _period(f, rate)
+        if p is None:
+            break
+        n = n * p // math.gcd(n, p)
+        if n > MAX_PERIOD:
+            break
+    else:
+        return n, False
+    # one second is a whole period of any set of integer frequencies
+    return rate, True
+
+
+def _interleave(mono, amplitude: float, channels: int) -> bytes:
+    """s16le frames from a -1..1 mono signal, copied to every channel."""
+    if np is not None:
+        x = np.round(np.asarray(mono, dtype=np.float64) * (amplitude * FULL_SCALE))
+        x = np.clip(x, -32768, 32767).astype('<i2')
+        return np.repeat(x[:, None], channels, axis=1).tobytes()
+    scale = amplitude * FULL_SCALE
+    x = array.array('h', (max(-32768, min(32767, int(round(v * scale)))) for v in mono))
+    if channels == 1:
+        return x.tobytes()
+    out = array.array('h', bytes(2 * len(x) * channels))
+    for c in range(channels):
+        out[c::channels] = x
+    return out.tobytes()
+
+
+def _sines(freqs, n: int, rate: int, snap: bool):
+    freqs = [round(f) if snap else f for f in freqs]
+    if np is not None:
+        t = np.arange(n, dtype=np.float64) / rate
+        x = np.zeros(n)
+        for f in freqs:
+            x += np.sin(2.0 * math.pi * f * t)
+        return x / len(freqs)
+    k = 2.0 * math.pi / rate
+    return [sum(math.sin(k * f * i) for f in freqs) / len(freqs) for i in range(n)]
+
+
+def _key_amp(amplitude: float) -> float:
+    return round(max(0.0, min(1.0, amplitude)), 4)
+
+
+@lru_cache(maxsize=64)
+def cycle(freqs: tuple, rate: int = RATE, amplitude: float = 0.9, channels: int = CHANNELS) -> bytes:
+    """One exact period of the (equal-weight) sum of sines at `freqs`, as s16le frames."""
+    n, snap = _common_period(freqs, rate)
+    return _interleave(_sines(freqs, n, rate, snap), amplitude, channels)
+
+
+def tile(period: bytes, nbytes: int) -> bytes:
+    """`period` repeated to exactly `nbytes`."""
+    if not period:
+        return bytes(nbytes)
+    reps, rest = divmod(nbytes, len(period))
+    return period * reps + period[:rest]
+
+
+def _nbytes(duration: float, rate: int, channels: int) -> int:
+    return int(rate * duration) * 2 * channels
+
+
+def tone(freq: float, duration: float, amplitude: float = 0.9, rate: int = RATE, channels: int = CHANNELS) -> bytes:
+    """Sine at `freq` Hz for `duration` seconds."""
+    return tile(cycle((float(freq),), rate, _key_amp(amplitude), channels), _nbytes(duration, rate, channels))
+
+
+def multitone(freqs, duration: float, amplitude: float = 0.9, rate: int = RATE, channels: int = CHANNELS) -> bytes:
+    """Equal-level sum of sines (peak never exceeds `amplitude`)."""
+    key = tuple(sorted(float(f) for f in freqs))
+    return tile(cycle(key, rate, _key_amp(amplitude), channels), _nbytes(duration, rate, channels))
+
+
+def _chirp_segment(f0: float, f1: float, duration: float, log: bool, start: int, n: int, rate: int):
+    """Samples start..start+n of a sweep as a -1..1 mono signal (phase is the integrated frequency)."""
+    T = float(duration)
+    if log and f0 > 0 and f1 > 0 and f0 != f1:
+        k = math.log(f1 / f0)
+        c = 2.0 * math.pi * f0 * T / k
+        if np is not None:
+            t = (start + np.arange(n)) / rate
+            return np.sin(c * (np.exp(k * t / T) - 1.0))
+        return [math.sin(c * (math.exp(k * (start + i) / rate / T) - 1.0)) for i in range(n)]
+    if np is not None:
+        t = (start + np.arange(n)) / rate
+        return np.sin(2.0 * math.pi * (f0 * t + (f1 - f0) * t * t / (2.0 * T)))
+    return [math.sin(2.0 * math.pi * (f0 * t + (f1 - f0) * t * t / (2.0 * T)))
+            for t in ((start + i) / rate for i in range(n))]
+
+
+@lru_cache(maxsize=8)
+def chirp(f0: float, f1: float, duration: float, amplitude: float = 0.9, rate: int = RATE,
+          channels: int = CHANNELS, log: bool = False) -> bytes:
+    """Sweep from `f0` to `f1` Hz over `duration` seconds (linear, or exponential with `log`)."""
+    return _interleave(_chirp_segment(f0, f1, duration, log, 0, int(rate * duration), rate), amplitude, channels)
+
+
+@lru_cache(maxsize=4)
+def _pink_cycle(rate: int, amplitude: float, channels: int, seed: int) -> bytes:
+    if np is not None:
+        # shape white noise by 1/sqrt(f) in the frequency domain: the result is exactly circular
+        white = np.random.default_rng(seed).standard_normal(PINK_PERIOD)
+        spec = np.fft.rfft(white)
+        spec[0] = 0
+        spec[1:] /= np.sqrt(np.arange(1, len(spec)))
+        x = np.fft.irfft(spec, PINK_PERIOD)
+        return _interleave(x / np.max(np.abs(x)), amplitude, channels)
+    # Paul Kellett's pink filter; the second pass over the same white noise starts
+    # from the state the first pass ended in, so the loop point is seamless
+    rng = random.Random(seed)
+    white = [rng.gauss(0.0, 1.0) for _ in range(PINK_PERIOD)]
+    b = [0.0] * 7
+    x = []
+    for _ in range(2):
+        x = []
+        for w in white:
+            b[0] = 0.99886*b[0] + w*0.0555179
+            b[1] = 0.99332*b[1] + w*0.0750759
+            b[2] = 0.96900*b[2] + w*0.1538520
+            b[3] = 0.86650*b[3] + w*0.3104856
+            b[4] = 0.55000*b[4] + w*0.5329522
+            b[5] = -0.7616*b[5] - w*0.0168980
+            x.append(b[0] + b[1] + b[2] + b[3] + b[4] + b[5] + b[6] + w*0.5362)
+            b[6] = w*0.115926
+    peak = max(abs(v) for v in x) or 1.0
+    return _interleave([v / peak for v in x], amplitude, channels)
+
+
+def pink_noise(duration: float, amplitude: float = 0.5, rate: int = RATE, channels: int = CHANNELS,
+               seed: int = 0) -> bytes:
+    """Pink (1/f) noise, the same signal on every channel."""
+    return tile(_pink_cycle(rate, _key_amp(amplitude), channels, seed), _nbytes(duration, rate, channels))
+
+
+# -- streaming -----------------------------------------------------------
+
+def stream(period: bytes, nbytes: int, block_bytes: int):
+    """Yield `period` tiled to exactly `nbytes`, at most `block_bytes` per block."""
+    if not period:
+        period = bytes(block_bytes)
+    # a window long enough that every block is a single slice starting inside one period
+    window = period * (block_bytes // len(period) + 2)
+    off = sent = 0
+    while sent < nbytes:
+        n = min(block_bytes, nbytes - sent)
+        yield window[off:off+n]
+        off = (off + n) % len(period)
+        sent += n
+
+
+def tone_blocks(freq: float, duration: float, amplitude: float = 0.9, rate: int = RATE,
+                channels: int = CHANNELS, block_frames: int = BLOCK_FRAMES):
+    period = cycle((float(freq),), rate, _key_amp(amplitude), channels)
+    return stream(period, _nbytes(duration, rate, channels), block_frames * 2 * channels)
+
+
+def multitone_blocks(freqs, duration: float, amplitude: float = 0.9, rate: int = RATE,
+                     channels: int = CHANNELS, block_frames: int = BLOCK_FRAMES):
+    period = cycle(tuple(sorted(float(f) for f in freqs)), rate, _key_amp(amplitude), channels)
+    return stream(period, _nbytes(duration, rate, channels), block_frames * 2 * channels)
+
+
+def pink_blocks(duration: float, amplitude: float = 0.5, rate: int = RATE, channels: int = CHANNELS,
+                seed: int = 0, block_frames: int = BLOCK_FRAMES):
+    period = _pink_cycle(rate, _key_amp(amplitude), channels, seed)
+    return stream(period, _nbytes(duration, rate, channels), block_frames * 2 * channels)
+
+
+def chirp_blocks(f0: float, f1: float, duration: float, amplitude: float = 0.9, rate: int = RATE,
+                 channels: int = CHANNELS, log: bool = False, block_frames: int = BLOCK_FRAMES):
+    """Like chirp(), synthesised one block at a time."""
+    n = int(rate * duration)
+    for start in range(0, n, block_frames):
+        yield _interleave(_chirp_segment(f0, f1, duration, log, start, min(block_frames, n - start), rate),
+                          amplitude, channels)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Stateless web front end for production (`gunicorn -c gunicorn.conf.py web:app`).
+
+Workers render pages and check logins themselves and forward every /api/*
+call to the playback daemon over its unix socket, so any number of them
+can run without touching the engine. Each worker keeps one upstream
+/api/events subscription while it has browsers connected and fans it out
+through its own EventHub.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import http.client
+from collections import OrderedDict
+
+from flask import Flask, Response, jsonify, request, render_template, session, redirect, url_for, stream_with_context
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import auth
+import event_stream
+import jobs
+from playback_daemon import SOCKET_PATH
+
+REQUEST_TIMEOUT_S = 30.0    # above app.JOB_WAIT_S, for ?wait=1 callers
+RELAY_INTERVAL_S = 0.1      # upstream rate; browsers get their own ?interval
+RELAY_RETRY_S = 1.0
+HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-length', 'content-encoding'}
+
+app = Flask(__name__)
+auth.configure(app)
+login_required = auth.login_required
+
+EVENTS = event_stream.EventHub()
+_RELAY = None
+_RELAY_LOCK = threading.Lock()
+_JOBS_SEEN = OrderedDict()      # job id -> state of the job events replayed to new clients
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _daemon_request(method: str, path: str, body=None, headers=None, timeout: float = REQUEST_TIMEOUT_S):
+    """Send one request to the playback daemon; returns (connection, response)."""
+    conn = _UnixConnection(SOCKET_PATH, timeout)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        return conn, conn.getresponse()
+    except Exception:
+        conn.close()
+        raise
+
+
+def _unavailable(err):
+    app.logger.warning('Playback daemon unavailable: %s', err)
+    return jsonify(success=False, message='playback daemon unavailable'), 503
+
+
+# -- event relay -----------------------------------------------------------
+
+def _relay_key(event: str, data):
+    # the daemon keys job updates per job; keep them apart here as well
+    if event == 'job' and isinstance(data, dict):
+        return f"job:{data.get('id')}"
+    return event
+
+
+def _track_job(data: dict) -> None:
+    """Retire cached job events the way the daemon's JobQueue evicts jobs (oldest finished beyond KEEP_JOBS)."""
+    _JOBS_SEEN[data.get('id')] = data.get('state')
+    while len(_JOBS_SEEN) > jobs.KEEP_JOBS:
+        old_id, old_state = next(iter(_JOBS_SEEN.items()))
+        if old_state not in jobs.FINISHED:
+            break
+        del _JOBS_SEEN[old_id]
+        EVENTS.forget(f'job:{old_id}')
+
+
+def _relay_once() -> None:
+    conn, resp = _daemon_request('GET', f'/api/events?interval={RELAY_INTERVAL_S}', timeout=None)
+    try:
+        event, data = None, []
+        while EVENTS.clients():
+            line = resp.readline()
+            if not line:
+                return
+            line = line.decode('utf-8').rstrip('\r\n')
+            if line.startswith('event:'):
+                event = line[6:].strip()
+            elif line.startswith('data:'):
+                data.append(line[5:].strip())
+            elif not line:
+                if event and data:
+                    try:
+                        payload = json.loads('\n'.join(data))
+                        EVENTS.publish(event, payload, key=_relay_key(event, payload))
+                        if event == 'job' and isinstance(payload, dict):
+                            _track_job(payload)
+                    except ValueError:
+                        pass
+                event, data = None, []
+    finally:
+        conn.close()
+
+
+def _relay_loop() -> None:
+    global _RELAY
+    while True:
+        try:
+            _relay_once()
+        except Exception:
+            pass
+        with _RELAY_LOCK:
+            if not EVENTS.clients():
+                _RELAY = None
+                return
+        time.sleep(RELAY_RETRY_S)
+
+
+def _ensure_relay() -> None:
+    global _RELAY
+    with _RELAY_LOCK:
+        if _RELAY is None:
+            _RELAY = threading.Thread(target=_relay_loop, name='event-relay', daemon=True)
+            _RELAY.start()
+
+
+# -- routes ----------------------------------------------------------------
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form.get('username', '').strip()
+        password = request.form.get('password', '').strip()
+        if auth.check_credentials(username, password):
+            session['logged_in'] = True
+            session['username'] = username
+            return redirect(url_for('index'))
+        return render_template('login.html', error='Invalid username or password')
+    return render_template('login.html')
+
+
+@app.route('/logout')
+def logout():
+    session.clear()
+    return redirect(url_for('login'))
+
+
+@app.route('/')
+@login_required
+def index():
+    config = {}
+    try:
+        conn, resp = _daemon_request('GET', '/api/config')
+        try:
+            config = json.loads(resp.read()).get('config') or {}
+        finally:
+            conn.close()
+    except Exception as e:
+        app.logger.warning('Could not load config from playback daemon: %s', e)
+    return render_template('index.html', session=session, config=config)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    try:
+        conn, resp = _daemon_request('GET', '/metrics')
+        try:
+            body = resp.read()
+        finally:
+            conn.close()
+    except Exception as e:
+        return _unavailable(e)
+    return Response(body, status=resp.status, mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    try:
+        min_interval = float(request.args.get('interval', 0.25))
+    except ValueError:
+        min_interval = 0.25
+    sub = EVENTS.subscribe(max(0.1, min(5.0, min_interval)))
+    if sub is None:
+        return jsonify(success=False, message='too many event clients'), 503
+    _ensure_relay()
+    return Response(stream_with_context(EVENTS.stream(sub)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/<path:path>', methods=['GET', 'POST'])
+@login_required
+def api_proxy(path: str):
+    target = '/api/' + path
+    if request.query_string:
+        target += '?' + request.query_string.decode('latin-1')
+    headers = {}
+    if request.content_type:
+        headers['Content-Type'] = request.content_type
+    try:
+        conn, resp = _daemon_request(request.method, target, body=request.get_data() or None, headers=headers)
+        try:
+            body = resp.read()
+        finally:
+            conn.close()
+    except Exception as e:
+        return _unavailable(e)
+    passed = [(k, v) for k, v in resp.getheaders() if k.lower() not in HOP_HEADERS]
+    return Response(body, status=resp.status, headers=passed)